@@ -1,14 +1,294 @@
+"""Run an org headless: models come from a config file, Aaron's messages from stdin or a scenario file, and
+messages to Aaron go to stdout (logs go to stderr).
+
+    aagents --config org.toml
+    aagents --config org.toml --scenario load.jsonl --linger 60 --json
+
+The config is TOML or JSON:
+
+    [models.opus]
+    provider = "anthropic"            # "openai", or "module:factory"; other keys are passed to the model
+    model = "claude-3-opus-20240229"
+    max_tokens = 4096
+
+    [models.haiku]
+    provider = "anthropic"
+    model = "claude-3-haiku-20240307"
+
+    [director]
+    model = "opus"
+    sub_model = "haiku"
+
+    [limits.opus]                     # optional, per model; enables the shared rate limiter
+    requests_per_minute = 50
+    max_in_flight = 4
+
+    [budgets.1]                       # optional, per rank; own_tokens, own_cost, subtree_tokens, subtree_cost
+    subtree_cost = 20
+
+    [wikipedia]                       # optional; WikipediaCache settings such as disk_path, ttl_seconds, or
+    fixtures = "wikipedia.json"       # fixtures to answer lookups from a JSON file instead of the network
+
+    [knowledge_base]                  # optional; enables the kb_ tools, kept in memory unless a path is given
+    path = "kb.db"
+
+    [llm_cache]                       # optional; record responses to a file, or replay them without the network
+    path = "responses.db"
+    mode = "record"                   # "replay" (unknown prompts fail) or "passthrough" (only count hits)
+
+    [runtime]                         # optional; overrides for the team_member module settings
+    stimulus_queue_limit = 200
+
+Scenario files have one message per line, either plain text or a JSON object such as
+``{"delay": 30, "message": "..."}`` where ``delay`` is seconds to wait after the previous message.
+"""
+import argparse
+import importlib
+import json
+import logging
 import sys
+import tomllib
+from datetime import datetime
+from threading import Lock
+from time import sleep
+
+from langchain_anthropic import ChatAnthropic
+from langchain_openai import ChatOpenAI
+
+from AaronsAgents import team_member
+from AaronsAgents.budget import Budget, BudgetLedger
+from AaronsAgents.knowledge_base import KnowledgeBase
+from AaronsAgents.llm_cache import RecordReplayChatModel, ResponseStore, RECORD, REPLAY
+from AaronsAgents.persistence import OrgStore
+from AaronsAgents.rate_limiter import RateLimiter
+from AaronsAgents.scheduler import AgentScheduler
+from AaronsAgents.team_member import TeamMember, Stimulus, hire_director
+from AaronsAgents.telemetry import telemetry
+from AaronsAgents.wikipedia_cache import WikipediaCache
+
+module_logger = logging.getLogger(__name__)
+
+# chat model classes by config "provider"
+providers = {
+    "anthropic": ChatAnthropic,
+    "openai": ChatOpenAI,
+}
+
+
+def load_config(path: str) -> dict:
+    with open(path, "rb") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return tomllib.load(f)
+
+
+def build_models(config: dict) -> dict:
+    models = {}
+    for key, options in config.get("models", {}).items():
+        options = dict(options)
+        provider = options.pop("provider", "anthropic")
+        if provider in providers:
+            factory = providers[provider]
+        elif ":" in provider:
+            module, _, name = provider.partition(":")
+            factory = getattr(importlib.import_module(module), name)
+        else:
+            raise ValueError(f"model {key}: unknown provider {provider!r}")
+        models[key] = factory(**options)
+    if "llm_cache" in config:
+        cache = dict(config["llm_cache"])
+        store = ResponseStore(cache.pop("path", None))
+        models = {key: RecordReplayChatModel(inner=model, store=store, **cache) for key, model in models.items()}
+    return models
+
+
+def replaying(config: dict) -> bool:
+    return config.get("llm_cache", {}).get("mode") == REPLAY
+
+
+# team_member settings that the [runtime] section may override
+runtime_settings = ("mandatory_sleep", "notepad_limit", "stimulus_queue_limit", "stimulus_overflow_policy",
+                    "history_token_budget", "budget_turn_spacing", "budget_slowdown", "streaming_turns")
+
+
+def apply_runtime(config: dict):
+    if replaying(config):
+        # the pause between turns only spares the provider's rate limits
+        team_member.mandatory_sleep = 0
+    for name, value in config.get("runtime", {}).items():
+        if name not in runtime_settings:
+            raise ValueError(f"unknown runtime setting {name!r}")
+        setattr(team_member, name, value)
+
+
+def build_rate_limiter(config: dict, models: dict, shards: int = 1) -> RateLimiter | None:
+    """The shared limiter for the configured models; with several shards, each gets an even share."""
+    limits = config.get("limits")
+    if not limits or replaying(config):
+        return None
+    limiter = RateLimiter()
+    for key, options in limits.items():
+        limiter.configure(models[key], **{name: max(1, value // shards) for name, value in options.items()})
+    return limiter
+
+
+def build_budget_ledger(config: dict) -> BudgetLedger | None:
+    budgets = config.get("budgets")
+    if not budgets:
+        return None
+    rank_limits = {}
+    for rank, options in budgets.items():
+        own = Budget(options.get("own_tokens"), options.get("own_cost"))
+        subtree = Budget(options.get("subtree_tokens"), options.get("subtree_cost"))
+        rank_limits[int(rank)] = (own, subtree)
+    return BudgetLedger(rank_limits)
+
+
+def read_scenario(lines: any):
+    """Yield (delay seconds, message) from scenario lines."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            entry = json.loads(line)
+            yield float(entry.get("delay", 0)), entry["message"]
+        else:
+            yield 0.0, line
+
+
+class HeadlessOrg:
+    """An org driven from the command line instead of the Streamlit UI."""
+
+    def __init__(self, config: dict, db_path: str = None, use_scheduler: bool = True, max_workers: int = 8,
+                 as_json: bool = False, out: any = sys.stdout):
+        self.log = module_logger.getChild(HeadlessOrg.__name__)
+        self.config = config
+        self.models = build_models(config)
+        team_member.verbose = False
+        apply_runtime(config)
+        team_member.aaron_message_callback = self.message_printer(as_json, out)
+        team_member.rate_limiter = build_rate_limiter(config, self.models)
+        team_member.budget_ledger = build_budget_ledger(config)
+        if "wikipedia" in config:
+            # live lookups unless fixtures are given
+            team_member.wikipedia_cache = WikipediaCache(**{"fetch": team_member.api_wrapper.run,
+                                                            **config["wikipedia"]})
+        if "knowledge_base" in config:
+            team_member.knowledge_base = KnowledgeBase(**config["knowledge_base"])
+        self.scheduler = AgentScheduler(max_workers) if use_scheduler else None
+        team_member.scheduler = self.scheduler
+        self.store = OrgStore(db_path, self.models) if db_path is not None else None
+        team_member.org_store = self.store
+        self.director = None
+
+    def start(self):
+        if self.store is not None:
+            self.store.restore()
+        self.director = TeamMember.team_members.get("Director")
+        if self.director is None:
+            director = self.config.get("director", {})
+            if director.get("model") not in self.models:
+                raise ValueError(f"director model {director.get('model')!r} is not configured")
+            self.director = hire_director(self.models[director["model"]],
+                                          self.models.get(director.get("sub_model")))
+        if self.scheduler is not None:
+            self.scheduler.start()
+
+    def send(self, message: str):
+        self.director.stimulate(Stimulus("message", f"From: Aaron\nTo: {self.director.name}\n{message}"))
+
+    @staticmethod
+    def message_printer(as_json: bool, out: any):
+        """An aaron_message_callback that writes each message to ``out`` as one line."""
+        lock = Lock()
+
+        def message_to_aaron(team_member_name: str, message: str):
+            if as_json:
+                line = json.dumps({"ts": datetime.now().isoformat(), "from": team_member_name, "message": message})
+            else:
+                line = f"{team_member_name}: {message}"
+            with lock:
+                print(line, file=out, flush=True)
+        return message_to_aaron
+
+    def stop(self):
+        team_member.keep_running = False
+        for member in list(TeamMember.team_members):
+            member.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop(10)
+        if self.store is not None:
+            self.store.close()
+        if team_member.knowledge_base is not None:
+            team_member.knowledge_base.close()
+        for key, model in self.models.items():
+            if isinstance(model, RecordReplayChatModel):
+                self.log.info(f"response cache for {key}: {model.stats()}")
+
+
+def run(args: argparse.Namespace):
+    if args.metrics_port is not None:
+        telemetry.serve(args.metrics_port)
+    if args.spans is not None:
+        telemetry.open_spans(args.spans)
+    config = load_config(args.config)
+    if args.record is not None or args.replay is not None:
+        config["llm_cache"] = {"path": args.record or args.replay, "mode": RECORD if args.record else REPLAY}
+    if args.shards is not None:
+        from AaronsAgents.sharding import ShardedOrg
+        printer = HeadlessOrg.message_printer(args.json, sys.stdout)
+        org = ShardedOrg(config, shards=args.shards, max_workers=args.workers, aaron_message_callback=printer)
+    else:
+        org = HeadlessOrg(config, db_path=args.db, use_scheduler=not args.threads, max_workers=args.workers,
+                          as_json=args.json)
+    org.start()
+    try:
+        source = open(args.scenario) if args.scenario is not None else sys.stdin
+        with source:
+            for delay, message in read_scenario(source):
+                sleep(delay)
+                org.send(message)
+        if args.linger is None:
+            # input is done but the org keeps working until interrupted
+            while True:
+                sleep(3600)
+        sleep(args.linger)
+    finally:
+        org.stop()
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="aagents", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", "-c", required=True, help="TOML or JSON model config")
+    parser.add_argument("--scenario", help="file of messages from Aaron (default: stdin)")
+    parser.add_argument("--linger", type=float,
+                        help="seconds to keep running after the last message (default: until interrupted)")
+    parser.add_argument("--db", help="SQLite file to persist the org to and restore it from")
+    parser.add_argument("--json", action="store_true", help="print messages to Aaron as JSON lines")
+    parser.add_argument("--workers", type=int, default=8, help="scheduler worker pool size")
+    parser.add_argument("--threads", action="store_true", help="use one thread per agent instead of the scheduler")
+    parser.add_argument("--shards", type=int,
+                        help="spread the org over this many worker processes (not with --db or --threads)")
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument("--record", metavar="FILE", help="answer from and record model responses to this file")
+    cache.add_argument("--replay", metavar="FILE",
+                       help="answer only from responses recorded in this file, without calling any provider")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument("--spans", help="append telemetry spans to this JSONL file")
+    args = parser.parse_args(argv)
+    if args.shards is not None and (args.db is not None or args.threads):
+        parser.error("--shards cannot be combined with --db or --threads")
+    return args
 
 
 def aa_main():
     try:
-        print("Hello World")
-    except SystemExit:
-        sys.exit(0)
+        run(parse_args())
     except KeyboardInterrupt:
         sys.exit(0)
     except Exception as ex:
-        print(f"Unhandled exception: {ex}")
+        print(f"Unhandled exception: {ex}", file=sys.stderr)
         sys.exit(1)
-    sys.exit(0)
\ No newline at end of file
+    sys.exit(0)
@@ -0,0 +1,36 @@
+"""Offline org benchmark: builds a TeamMember org on ScriptedChatModel, drives work items through it and
+reports delivery latency, scheduler wake latency, turns/sec, prompt render time and peak RSS.
+
+    python -m AaronsAgents.bench --depth 3 --fanout 4 --rate 10 --duration 10
+"""
+import argparse
+import json
+
+from AaronsAgents.bench.harness import OrgSimulation
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m AaronsAgents.bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3, help="levels in the org, Director included")
+    parser.add_argument("--fanout", type=int, default=3, help="direct reports per manager")
+    parser.add_argument("--rate", type=float, default=5, help="work items per second sent to the Director")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to send work items for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8, help="scheduler worker pool size")
+    parser.add_argument("--threads", action="store_true", help="use one thread per agent instead of the scheduler")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    simulation = OrgSimulation(depth=args.depth, fanout=args.fanout, message_rate=args.rate, seed=args.seed,
+                               scheduler=not args.threads, max_workers=args.workers)
+    results = simulation.run(args.duration)
+    if args.json:
+        print(json.dumps(results))
+        return
+    for key, value in results.items():
+        print(f"{key:28} {value:12.2f}" if isinstance(value, float) else f"{key:28} {value:12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Microbenchmark for per-turn agent setup cost.
+
+Compares rebuilding the tools and executor on every turn (the old ``process()`` behavior) with reusing the
+executor built once per team member. Runs offline against ScriptedChatModel.
+
+    python -m AaronsAgents.bench.executor_setup --turns 500
+"""
+import argparse
+import logging
+import tracemalloc
+from time import perf_counter
+
+from AaronsAgents import team_member
+from AaronsAgents.bench.fake_model import ScriptedChatModel
+from AaronsAgents.scheduler import AgentScheduler
+from AaronsAgents.team_member import TeamMember
+
+
+def measure(fn, turns: int) -> tuple[float, int]:
+    """Returns (mean seconds per call, bytes allocated by one call)."""
+    fn()
+    start = perf_counter()
+    for _ in range(turns):
+        fn()
+    elapsed = (perf_counter() - start) / turns
+    tracemalloc.start()
+    fn()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # an unstarted scheduler keeps the member from running turns on its own
+    team_member.scheduler = AgentScheduler()
+    member = TeamMember(name="Bench", personality="", title="Benchmark", job_description="", rank=2,
+                        model=ScriptedChatModel(), manager=None)
+
+    rebuild, rebuild_bytes = measure(member.build_agent, args.turns)
+    cached, cached_bytes = measure(member.get_agent, args.turns)
+    print(f"rebuild every turn: {rebuild * 1e6:10.1f} us/turn {rebuild_bytes / 1024:10.1f} KiB/turn")
+    print(f"cached executor:    {cached * 1e6:10.1f} us/turn {cached_bytes / 1024:10.1f} KiB/turn")
+    print(f"speedup:            {rebuild / cached:10.0f}x")
+    member.stop()
+
+
+if __name__ == "__main__":
+    main()
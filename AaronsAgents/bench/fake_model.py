@@ -0,0 +1,48 @@
+import json
+from time import sleep
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers from a script instead of a provider, for benchmarks and offline runs.
+
+    ``script`` receives the prompt messages and returns the AIMessage to emit, including any tool calls.
+    Without a script the model just goes back to sleep. When streamed, the content and then each tool call
+    arrive as separate chunks, ``chunk_delay`` seconds apart, like a provider generating them."""
+
+    script: Optional[Callable[[List[BaseMessage]], AIMessage]] = None
+    chunk_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence[BaseTool], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        return self.script(messages) if self.script is not None else AIMessage(content="Nothing to do. Sleeping.")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._respond(messages)
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(str(message.content)) // 4 + 10 * len(message.tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}})
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._respond(messages)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=message.content))
+        for index, call in enumerate(message.tool_calls):
+            sleep(self.chunk_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}]))
@@ -0,0 +1,159 @@
+import logging
+import random
+import re
+import resource
+from datetime import datetime
+from threading import Lock
+from time import perf_counter, sleep
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from AaronsAgents import team_member
+from AaronsAgents.bench.fake_model import ScriptedChatModel
+from AaronsAgents.scheduler import AgentScheduler
+from AaronsAgents.team_member import TeamMember, Stimulus
+
+work_item = re.compile(r"work-item (\d+)")
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+class OrgSimulation:
+    """Stands up a TeamMember org of a given shape on ScriptedChatModel and measures it.
+
+    The org is a tree under a rank 1 Director, ``depth`` levels deep with ``fanout`` reports per manager. Work
+    items are sent to the Director as if from Aaron at ``message_rate`` per second. Every manager forwards each
+    item to one report, chosen by a seeded RNG, until it reaches a worker at the bottom. End-to-end latency is
+    measured from the message to Aaron to the worker's turn that sees it."""
+
+    def __init__(self, depth: int = 3, fanout: int = 3, message_rate: float = 5, seed: int = 0,
+                 scheduler: bool = True, max_workers: int = 8):
+        self.depth = depth
+        self.fanout = fanout
+        self.message_rate = message_rate
+        self.random = random.Random(seed)
+        self.use_scheduler = scheduler
+        self.max_workers = max_workers
+        self.members = []
+        self._lock = Lock()
+        self.sent = {}
+        self.delivered = {}
+        self.wake_latency = []
+        self.turns = 0
+        self.turn_seconds = []
+
+    def script_for(self, name: str):
+        def script(messages: list[BaseMessage]) -> AIMessage:
+            if isinstance(messages[-1], ToolMessage):
+                return AIMessage(content="Delegated. Going back to sleep.")
+            stimuli = next(m for m in reversed(messages) if isinstance(m, HumanMessage)).content
+            items = work_item.findall(stimuli)
+            reports = TeamMember.team_members.reports(name)
+            if not reports:
+                now = perf_counter()
+                with self._lock:
+                    for item in items:
+                        self.delivered.setdefault(int(item), now)
+                return AIMessage(content="Done with my work items.")
+            calls = []
+            for item in items:
+                with self._lock:
+                    recipient = self.random.choice(reports).name
+                calls.append({"name": "messaging_send", "id": f"{name}-{item}",
+                              "args": {"team_member_name": recipient, "message": f"Please handle work-item {item}"}})
+            return AIMessage(content="", tool_calls=calls)
+        return script
+
+    def instrument(self, member: TeamMember):
+        """Record wake latency and turn time by wrapping the member's process()."""
+        process = member.process
+
+        def timed_process(*args, **kwargs):
+            start = perf_counter()
+            waiting = [stim.ts for stim in member.stimulus_queue if stim.type == "message"]
+            if waiting:
+                latency = (datetime.now() - min(waiting)).total_seconds()
+            process(*args, **kwargs)
+            with self._lock:
+                self.turns += 1
+                self.turn_seconds.append(perf_counter() - start)
+                if waiting:
+                    self.wake_latency.append(latency)
+        member.process = timed_process
+
+    def hire(self, name: str, rank: int, manager: TeamMember | None) -> TeamMember:
+        member = TeamMember(name=name, personality="Efficient.", title=f"Rank {rank} Simulator",
+                            job_description="Forward work items to your reports.", rank=rank,
+                            model=ScriptedChatModel(script=self.script_for(name)), manager=manager,
+                            before_start_callback=self.instrument)
+        self.members.append(member)
+        return member
+
+    def build(self):
+        team_member.verbose = False
+        team_member.mandatory_sleep = 0
+        if self.use_scheduler:
+            team_member.scheduler = AgentScheduler(max_workers=self.max_workers)
+        level = [self.hire("Director", 1, None)]
+        for rank in range(2, self.depth + 1):
+            level = [self.hire(f"{manager.name}.{i}", rank, manager) for manager in level for i in range(self.fanout)]
+
+    def measure_prompt_render(self, samples: int = 200) -> float:
+        member = self.members[-1]
+        start = perf_counter()
+        for _ in range(samples):
+            member.get_system_prompt()
+        return (perf_counter() - start) / samples
+
+    def run(self, duration: float) -> dict:
+        logging.getLogger().setLevel(logging.WARNING)
+        self.build()
+        if team_member.scheduler is not None:
+            team_member.scheduler.start()
+        director = self.members[0]
+        interval = 1 / self.message_rate
+        start = perf_counter()
+        item = 0
+        while perf_counter() - start < duration:
+            with self._lock:
+                self.sent[item] = perf_counter()
+            director.stimulate(Stimulus("message", f"From: Aaron\nTo: Director\nPlease handle work-item {item}"))
+            item += 1
+            sleep(max(0.0, start + item * interval - perf_counter()))
+        # let in-flight items drain
+        drain_deadline = perf_counter() + 10
+        while len(self.delivered) < len(self.sent) and perf_counter() < drain_deadline:
+            sleep(0.05)
+        elapsed = perf_counter() - start
+        render = self.measure_prompt_render()
+        self.stop()
+
+        latency = [self.delivered[i] - self.sent[i] for i in self.delivered]
+        return {
+            "agents": len(self.members),
+            "messages_sent": len(self.sent),
+            "messages_delivered": len(self.delivered),
+            "delivery_latency_p50_ms": percentile(latency, 50) * 1000,
+            "delivery_latency_p99_ms": percentile(latency, 99) * 1000,
+            "wake_latency_p50_ms": percentile(self.wake_latency, 50) * 1000,
+            "wake_latency_p99_ms": percentile(self.wake_latency, 99) * 1000,
+            "turns": self.turns,
+            "turns_per_second": self.turns / elapsed,
+            "turn_p50_ms": percentile(self.turn_seconds, 50) * 1000,
+            "prompt_render_us": render * 1e6,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+    def stop(self):
+        team_member.keep_running = False
+        for member in self.members:
+            member.stop()
+        if team_member.scheduler is not None:
+            team_member.scheduler.stop(5)
+            team_member.scheduler = None
+        team_member.keep_running = True
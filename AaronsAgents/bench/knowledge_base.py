@@ -0,0 +1,79 @@
+"""Offline benchmark for the knowledge base index.
+
+Fills a knowledge base with synthetic entries drawn from a Zipf-like vocabulary, then times searches while
+other threads keep adding and updating entries.
+
+    python -m AaronsAgents.bench.knowledge_base --entries 100000 --searches 1000 --writers 2 --write-rate 20
+"""
+import argparse
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from threading import Event
+from time import perf_counter
+
+from AaronsAgents.bench.harness import percentile
+from AaronsAgents.knowledge_base import KnowledgeBase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=60, help="words per entry")
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--searches", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=4, help="threads searching at once")
+    parser.add_argument("--writers", type=int, default=2, help="threads adding and updating while searches run")
+    parser.add_argument("--write-rate", type=float, default=20, help="writes per second per writer thread")
+    parser.add_argument("--path", help="SQLite file to store entries in (default: memory only)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(args.vocabulary)))
+
+    def text(words: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+    kb = KnowledgeBase(args.path)
+    start = perf_counter()
+    for i in range(args.entries):
+        kb.add(f"Entry {i} {text(4)}", text(args.words), "bench")
+    print(f"indexed {args.entries} entries in {perf_counter() - start:.1f}s")
+
+    queries = [text(rng.randint(1, 4)) for _ in range(args.searches)]
+    stop = Event()
+    writes = [0] * args.writers
+
+    def write(writer: int):
+        writer_rng = random.Random(writer)
+        while not stop.is_set():
+            if writer_rng.random() < 0.5:
+                kb.add(f"New {writer}", text(args.words), "bench")
+            else:
+                kb.update(writer_rng.randint(1, args.entries), "bench", content=text(args.words))
+            writes[writer] += 1
+            stop.wait(1 / args.write_rate)
+
+    def search(query: str) -> float:
+        began = perf_counter()
+        kb.search(query)
+        return perf_counter() - began
+
+    with ThreadPoolExecutor(max_workers=args.writers) as writers:
+        for writer in range(args.writers):
+            writers.submit(write, writer)
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=args.readers) as readers:
+            latency = list(readers.map(search, queries))
+        elapsed = perf_counter() - start
+        stop.set()
+    print(f"{args.searches} searches on {args.readers} threads in {elapsed:.2f}s with {sum(writes)} concurrent writes")
+    print(f"  search_p50_ms          {percentile(latency, 50) * 1000:.2f}")
+    print(f"  search_p99_ms          {percentile(latency, 99) * 1000:.2f}")
+    for key, value in kb.stats().items():
+        print(f"  {key:22} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Compare one shard against several on the same scripted org. Everything runs on localhost and makes no API
+calls; the models are ScriptedChatModels built in each shard process.
+
+Work items enter at the Director, are forwarded down the tree to a worker, and the worker reports back to the
+Director, who tells Aaron. Throughput and end-to-end latency are measured from Aaron's side.
+
+    python -m AaronsAgents.bench.sharding --shards 1 4 --depth 3 --fanout 4 --rate 20 --duration 20
+"""
+import argparse
+import json
+import logging
+import re
+from threading import Lock
+from time import perf_counter, sleep
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from AaronsAgents.bench.fake_model import ScriptedChatModel
+from AaronsAgents.bench.harness import percentile
+from AaronsAgents.sharding import ShardedOrg
+
+own_name = re.compile(r"Your name is \*\*(.+?)\*\*")
+work_item = re.compile(r"Please handle work-item (\d+)")
+done_item = re.compile(r"done work-item (\d+)")
+
+config = {
+    "models": {"fake": {"provider": "AaronsAgents.bench.sharding:forwarding_model"}},
+    "director": {"model": "fake"},
+    # the Director sees every completion; let its queue absorb bursts rather than drop them
+    "runtime": {"mandatory_sleep": 0, "stimulus_queue_limit": 10_000},
+}
+
+
+def forward(messages: list[BaseMessage]) -> AIMessage:
+    from AaronsAgents.team_member import TeamMember
+    if isinstance(messages[-1], ToolMessage):
+        return AIMessage(content="Delegated. Going back to sleep.")
+    system = next(m.content for m in messages if isinstance(m, SystemMessage))
+    match = own_name.search(system)
+    if match is None:
+        # history summary request
+        return AIMessage(content="Forwarded work items.")
+    name = match.group(1)
+    stimuli = next(m for m in reversed(messages) if isinstance(m, HumanMessage)).content
+    items = work_item.findall(stimuli)
+    done = done_item.findall(stimuli)
+    calls = []
+    if done and name == "Director":
+        calls.append({"name": "messaging_send", "id": "done", "args": {
+            "team_member_name": "Aaron", "message": " ".join(f"done work-item {item}" for item in done)}})
+    reports = sorted(member.name for member in TeamMember.team_members.reports(name))
+    if reports:
+        calls.extend({"name": "messaging_send", "id": f"item-{item}", "args": {
+            "team_member_name": reports[int(item) % len(reports)], "message": f"Please handle work-item {item}"}}
+            for item in items)
+    elif items:
+        calls.append({"name": "messaging_send", "id": "report", "args": {
+            "team_member_name": "Director", "message": " ".join(f"done work-item {item}" for item in items)}})
+    if not calls:
+        return AIMessage(content="Nothing to do. Sleeping.")
+    return AIMessage(content="", tool_calls=calls)
+
+
+def forwarding_model(**kwargs) -> ScriptedChatModel:
+    return ScriptedChatModel(script=forward, **kwargs)
+
+
+def run(shards: int, depth: int, fanout: int, rate: float, duration: float, workers: int) -> dict:
+    lock = Lock()
+    sent = {}
+    delivered = {}
+
+    def message_to_aaron(team_member_name: str, message: str):
+        now = perf_counter()
+        with lock:
+            for item in done_item.findall(message):
+                delivered.setdefault(int(item), now)
+
+    org = ShardedOrg(config, shards=shards, max_workers=workers, aaron_message_callback=message_to_aaron)
+    org.start()
+    try:
+        level = ["Director"]
+        for rank in range(2, depth + 1):
+            next_level = []
+            for manager in level:
+                for i in range(fanout):
+                    name = f"{manager}.{i}"
+                    result = org.hire(name, "Efficient.", f"Rank {rank} Simulator",
+                                      "Forward work items to your reports.", rank, "fake", manager=manager)
+                    if not result.startswith("success"):
+                        raise RuntimeError(result)
+                    next_level.append(name)
+            level = next_level
+        start = perf_counter()
+        item = 0
+        while perf_counter() - start < duration:
+            with lock:
+                sent[item] = perf_counter()
+            org.send(f"Please handle work-item {item}")
+            item += 1
+            sleep(max(0.0, start + item / rate - perf_counter()))
+        drain_deadline = perf_counter() + 30
+        while len(delivered) < len(sent) and perf_counter() < drain_deadline:
+            sleep(0.1)
+        elapsed = perf_counter() - start
+        sizes = org.shard_sizes()
+    finally:
+        org.stop()
+    latency = [delivered[i] - sent[i] for i in delivered if i in sent]
+    return {
+        "shards": shards,
+        "agents": sum(sizes),
+        "members_per_shard": sizes,
+        "messages_sent": len(sent),
+        "messages_delivered": len(delivered),
+        "delivered_per_second": len(delivered) / elapsed,
+        "latency_p50_ms": percentile(latency, 50) * 1000,
+        "latency_p99_ms": percentile(latency, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m AaronsAgents.bench.sharding", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4], help="shard counts to compare")
+    parser.add_argument("--depth", type=int, default=3, help="levels in the org, Director included")
+    parser.add_argument("--fanout", type=int, default=4, help="direct reports per manager")
+    parser.add_argument("--rate", type=float, default=20, help="work items per second sent to the Director")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to send work items for")
+    parser.add_argument("--workers", type=int, default=8, help="scheduler worker pool size per shard")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for shards in args.shards:
+        results = run(shards, args.depth, args.fanout, args.rate, args.duration, args.workers)
+        if args.json:
+            print(json.dumps(results))
+            continue
+        for key, value in results.items():
+            print(f"{key:24} {value:12.2f}" if isinstance(value, float) else f"{key:24} {str(value):>12}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
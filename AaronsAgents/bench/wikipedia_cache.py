@@ -0,0 +1,48 @@
+"""Offline benchmark for the shared Wikipedia cache.
+
+Simulates several agents researching the same topics at once. Fetches come from fixtures with an artificial
+round-trip delay, so no network is used.
+
+    python -m AaronsAgents.bench.wikipedia_cache --agents 8 --topics 20 --latency 0.3
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+from AaronsAgents.wikipedia_cache import WikipediaCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per Wikipedia round trip")
+    args = parser.parse_args()
+
+    fixtures = WikipediaCache(fixtures={f"Topic {i}": f"Page: Topic {i}\nSummary: ..." for i in range(args.topics)})
+
+    def fetch(query: str) -> str:
+        sleep(args.latency)
+        return fixtures.fetch(query)
+
+    cache = WikipediaCache(fetch)
+
+    def research(agent: int):
+        for i in range(args.topics):
+            # agents phrase the same query differently
+            cache.lookup(f"topic {i}" if agent % 2 else f"  Topic {i} ")
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=args.agents) as pool:
+        list(pool.map(research, range(args.agents)))
+    elapsed = perf_counter() - start
+    stats = cache.stats()
+    print(f"{args.agents} agents x {args.topics} lookups in {elapsed:.2f}s using {stats['misses']} fetches "
+          f"(uncached: {args.agents * args.topics} fetches, {args.agents * args.topics * args.latency:.1f}s of "
+          f"blocking round trips)")
+    for key, value in stats.items():
+        print(f"  {key:22} {value}")
+
+
+if __name__ == "__main__":
+    main()
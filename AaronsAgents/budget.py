@@ -0,0 +1,185 @@
+import logging
+from threading import Lock
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from AaronsAgents.rate_limiter import estimate_tokens, token_usage
+from AaronsAgents.telemetry import model_name
+
+module_logger = logging.getLogger(__name__)
+
+OK = "ok"
+NEAR = "near"
+EXHAUSTED = "exhausted"
+
+# USD per million (input, output) tokens; models not listed are only limited by tokens
+prices = {
+    "claude-3-opus-20240229": (15.0, 75.0),
+    "claude-3-sonnet-20240229": (3.0, 15.0),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (5.0, 15.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+
+def cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = prices.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class Budget:
+    """Spending limit in tokens and/or USD. ``None`` means unlimited."""
+
+    def __init__(self, tokens: int = None, cost: float = None):
+        self.tokens = tokens
+        self.cost = cost
+
+    def fraction(self, tokens: int, cost: float) -> float:
+        fractions = [0.0]
+        if self.tokens is not None:
+            fractions.append(tokens / self.tokens if self.tokens > 0 else float("inf"))
+        if self.cost is not None:
+            fractions.append(cost / self.cost if self.cost > 0 else float("inf"))
+        return max(fractions)
+
+    def __repr__(self):
+        return f"Budget(tokens={self.tokens}, cost={self.cost})"
+
+
+class BudgetLedger:
+    """Token and cost accounting for every team member, rolled up the manager tree.
+
+    Each member may have an ``own`` limit on what it spends itself and a ``subtree`` limit on what it and
+    everyone under it spend together, so a Director's subtree budget covers the whole org it hired. Limits
+    not set explicitly come from ``rank_limits`` (rank -> (own, subtree)). A member is ``NEAR`` once any limit
+    that covers it reaches ``warn_fraction``, and ``EXHAUSTED`` at 100%."""
+
+    def __init__(self, rank_limits: dict[int, tuple[Budget | None, Budget | None]] = None,
+                 warn_fraction: float = 0.8):
+        self.log = module_logger.getChild(BudgetLedger.__name__)
+        self.rank_limits = rank_limits or {}
+        self.warn_fraction = warn_fraction
+        self._lock = Lock()
+        self._own = {}
+        self._subtree = {}
+        self._limits = {}
+        self._exhausted = set()
+
+    def set_limits(self, name: str, own: Budget = None, subtree: Budget = None):
+        with self._lock:
+            self._limits[name] = (own, subtree)
+            # a new limit re-arms the exhaustion notice
+            self._exhausted = {key for key in self._exhausted if key[0] != name}
+
+    def limits(self, member: any) -> tuple[Budget | None, Budget | None]:
+        with self._lock:
+            return self._limits_for(member)
+
+    def charge(self, member: any, model: str, input_tokens: int, output_tokens: int) -> list[tuple[any, str]]:
+        """Record usage by ``member`` against it and every manager above it. Returns (owner, scope) for each
+        limit that this charge exhausted, where scope is "own" or "subtree"."""
+        spent = cost(model, input_tokens, output_tokens)
+        tokens = input_tokens + output_tokens
+        exhausted = []
+        with self._lock:
+            for totals in [self._own.setdefault(member.name, [0, 0.0])] + [
+                    self._subtree.setdefault(owner.name, [0, 0.0]) for owner in self._chain(member)]:
+                totals[0] += tokens
+                totals[1] += spent
+            for scope, owner, fraction in self._fractions(member):
+                if fraction >= 1 and (owner.name, scope) not in self._exhausted:
+                    self._exhausted.add((owner.name, scope))
+                    exhausted.append((owner, scope))
+        for owner, scope in exhausted:
+            self.log.warning(f"{owner.name}: {scope} budget exhausted")
+        return exhausted
+
+    def pressure(self, member: any) -> float:
+        """Highest fraction used of any limit that covers ``member``."""
+        with self._lock:
+            return max((fraction for _, _, fraction in self._fractions(member)), default=0.0)
+
+    def state(self, member: any) -> str:
+        pressure = self.pressure(member)
+        if pressure >= 1:
+            return EXHAUSTED
+        return NEAR if pressure >= self.warn_fraction else OK
+
+    def usage(self, name: str) -> dict:
+        with self._lock:
+            own = self._own.get(name, (0, 0.0))
+            subtree = self._subtree.get(name, (0, 0.0))
+        return {"tokens": own[0], "cost": own[1], "subtree_tokens": subtree[0], "subtree_cost": subtree[1]}
+
+    def reset(self, name: str = None):
+        """Zero the spend of one member (not its subtree roll-up) or, with no name, of everyone."""
+        with self._lock:
+            if name is None:
+                self._own.clear()
+                self._subtree.clear()
+                self._exhausted.clear()
+            else:
+                self._own.pop(name, None)
+                self._exhausted = {key for key in self._exhausted if key[0] != name}
+
+    def _limits_for(self, member: any) -> tuple[Budget | None, Budget | None]:
+        limits = self._limits.get(member.name)
+        return limits if limits is not None else self.rank_limits.get(member.rank, (None, None))
+
+    @staticmethod
+    def _chain(member: any):
+        while member is not None:
+            yield member
+            member = member.manager
+
+    def _fractions(self, member: any):
+        own_limit, _ = self._limits_for(member)
+        if own_limit is not None:
+            yield "own", member, own_limit.fraction(*self._own.get(member.name, (0, 0.0)))
+        for owner in self._chain(member):
+            _, subtree_limit = self._limits_for(owner)
+            if subtree_limit is not None:
+                yield "subtree", owner, subtree_limit.fraction(*self._subtree.get(owner.name, (0, 0.0)))
+
+
+class BudgetCallback(BaseCallbackHandler):
+    """Charges every chat model call to a team member, and refuses to start calls once it is out of budget."""
+
+    raise_error = True
+
+    def __init__(self, ledger: BudgetLedger, member: any, model: any, on_exhausted: any = None):
+        self.ledger = ledger
+        self.member = member
+        self.model = model_name(model)
+        self.on_exhausted = on_exhausted
+        # estimated input tokens by run, for streamed calls whose provider reports no usage
+        self.estimates = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list[list[BaseMessage]], *, run_id: UUID,
+                            **kwargs: Any) -> Any:
+        if self.ledger.state(self.member) == EXHAUSTED:
+            raise BudgetExhausted(f"{self.member.name} is out of budget")
+        self.estimates[run_id] = sum(estimate_tokens(m) for m in messages)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        estimated_input = self.estimates.pop(run_id, 0)
+        usage = token_usage(response)
+        if usage is None:
+            output = [g.message for gs in response.generations for g in gs if hasattr(g, "message")]
+            usage = estimated_input, estimate_tokens(output) + sum(len(str(getattr(m, "tool_calls", []))) // 4
+                                                                        for m in output)
+        for owner, scope in self.ledger.charge(self.member, self.model, *usage):
+            if self.on_exhausted is not None:
+                self.on_exhausted(owner, scope)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self.estimates.pop(run_id, None)
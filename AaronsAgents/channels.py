@@ -0,0 +1,78 @@
+from threading import RLock
+
+AARON = "Aaron"
+team_prefix = "team:"
+
+
+class ChannelError(Exception):
+    pass
+
+
+class ChannelRegistry:
+    """Named groups of team members for one-call broadcast.
+
+    Every manager has a team channel, ``team:<manager name>``, made up of the manager and its direct reports.
+    It is derived from the ``TeamRegistry`` and so follows hires and fires without bookkeeping. Ad-hoc channels
+    are created by a member with an explicit member list and shrink as their members are fired. ``"Aaron"`` may
+    be a member of an ad-hoc channel."""
+
+    def __init__(self, team_members: any):
+        self.team_members = team_members
+        self._lock = RLock()
+        self._channels = {}
+
+    @staticmethod
+    def team_channel(manager_name: str) -> str:
+        return f"{team_prefix}{manager_name}"
+
+    def create(self, name: str, owner: any, member_names: list[str]) -> list[str]:
+        """Create an ad-hoc channel of ``owner`` and ``member_names``. Returns the resolved member list."""
+        name = name.strip()
+        if not name or name.startswith(team_prefix):
+            raise ChannelError(f"channel name **{name}** is reserved or empty")
+        members = [owner.name]
+        for member_name in member_names:
+            member_name = member_name.strip()
+            if member_name in members:
+                continue
+            if member_name != AARON and self.team_members.get(member_name) is None:
+                raise ChannelError(f"team member **{member_name}** not found")
+            members.append(member_name)
+        with self._lock:
+            if name in self._channels:
+                raise ChannelError(f"channel **{name}** already exists")
+            self._channels[name] = members
+        return list(members)
+
+    def members(self, name: str) -> list[str] | None:
+        """Member names of a channel, or None if there is no such channel."""
+        if name.startswith(team_prefix):
+            manager_name = name[len(team_prefix):]
+            reports = self.team_members.reports(manager_name)
+            if not reports or self.team_members.get(manager_name) is None:
+                return None
+            return [manager_name] + [report.name for report in reports]
+        with self._lock:
+            members = self._channels.get(name)
+            return list(members) if members is not None else None
+
+    def channels_of(self, member: any) -> list[tuple[str, list[str]]]:
+        """Every channel ``member`` belongs to, with its members."""
+        ret = []
+        for manager_name in ([member.manager.name] if member.manager is not None else []) + [member.name]:
+            channel = self.team_channel(manager_name)
+            members = self.members(channel)
+            if members is not None:
+                ret.append((channel, members))
+        with self._lock:
+            ret.extend((name, list(members)) for name, members in self._channels.items() if member.name in members)
+        return ret
+
+    def remove_member(self, name: str):
+        """Drop a fired member from every ad-hoc channel, deleting channels left with nobody to talk to."""
+        with self._lock:
+            for channel, members in list(self._channels.items()):
+                if name in members:
+                    members.remove(name)
+                    if len(members) < 2:
+                        del self._channels[channel]
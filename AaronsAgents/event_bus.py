@@ -0,0 +1,70 @@
+from collections import deque
+from datetime import datetime
+from threading import Lock
+
+AARON_MESSAGE = "aaron_message"
+MEMBER = "member"
+
+
+class Event:
+    def __init__(self, seq: int, topic: str, payload: dict, ts: datetime = None):
+        self.seq = seq
+        self.topic = topic
+        self.payload = payload
+        self.ts = ts if ts is not None else datetime.now()
+
+
+class EventBus:
+    """In-process pub/sub between agent threads and a UI.
+
+    Publishers append events to a bounded log and never block on readers. Each reader keeps its own cursor and
+    asks for everything after it with ``since()``, so any number of readers can drain at their own pace and
+    in batches. Retained state (``set_state()``) holds the latest value per (topic, key), such as each
+    member's presence and queue depth, for readers that only want the current picture."""
+
+    def __init__(self, max_events: int = 10000):
+        self._lock = Lock()
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+        self._state = {}
+
+    def publish(self, topic: str, payload: dict) -> Event:
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, topic, payload)
+            self._events.append(event)
+        return event
+
+    def since(self, seq: int, topics: set[str] = None, limit: int = None) -> tuple[list[Event], int]:
+        """Events after ``seq`` (optionally only some topics, at most ``limit``), and the cursor to pass next
+        time. Events that fell off the bounded log are skipped."""
+        with self._lock:
+            if not self._events or self._events[-1].seq <= seq:
+                return [], max(seq, self._seq)
+            start = max(0, seq - self._events[0].seq + 1)
+            ret = []
+            cursor = seq
+            for i in range(start, len(self._events)):
+                event = self._events[i]
+                if limit is not None and len(ret) >= limit:
+                    break
+                cursor = event.seq
+                if topics is None or event.topic in topics:
+                    ret.append(event)
+            return ret, cursor
+
+    def set_state(self, topic: str, key: str, value: dict):
+        with self._lock:
+            self._state.setdefault(topic, {})[key] = value
+
+    def clear_state(self, topic: str, key: str):
+        with self._lock:
+            self._state.get(topic, {}).pop(key, None)
+
+    def state(self, topic: str) -> dict:
+        with self._lock:
+            return dict(self._state.get(topic, {}))
+
+    @property
+    def seq(self) -> int:
+        return self._seq
@@ -0,0 +1,381 @@
+import heapq
+import logging
+import math
+import re
+import sqlite3
+from collections import Counter
+from datetime import datetime
+from threading import Condition, Lock
+
+module_logger = logging.getLogger(__name__)
+
+schema = """
+create table if not exists kb_entries (
+    id integer primary key autoincrement,
+    title text not null,
+    content text not null,
+    tags text not null,
+    author text not null,
+    created text not null,
+    updated text not null,
+    version integer not null
+);
+create index if not exists kb_entries_version on kb_entries (version);
+"""
+
+# terms in at least this many entries also get impact tiers, see KnowledgeBase._rank
+tier_threshold = 1000
+tier_count = 64
+
+word = re.compile(r"[a-z0-9]+")
+stopwords = frozenset("a an and are as at be by for from has have in is it its of on or that the this to was were "
+                      "will with".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [term for term in word.findall(text.lower()) if term not in stopwords]
+
+
+class KnowledgeBaseError(Exception):
+    pass
+
+
+class Entry:
+    def __init__(self, id: int, title: str, content: str, tags: list[str], author: str, created: datetime,
+                 updated: datetime):
+        self.id = id
+        self.title = title
+        self.content = content
+        self.tags = tags
+        self.author = author
+        self.created = created
+        self.updated = updated
+
+    def text(self) -> str:
+        return f"{self.title}\n{' '.join(self.tags)}\n{self.content}"
+
+
+class ReadWriteLock:
+    """Any number of readers or one writer. Waiting writers hold off new readers so writes are not starved."""
+
+    def __init__(self):
+        self._cond = Condition(Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class KnowledgeBase:
+    """Shared knowledge base with an in-memory inverted index ranked by BM25.
+
+    Every add or update re-indexes only the entry it touches. Searches from any number of agent threads run
+    concurrently; writes take the index exclusively for as long as it takes to patch one entry's postings.
+    With ``path`` the entries live in a SQLite file and the index is rebuilt from it at start. Other processes
+    (shards) may write to the same file: each instance picks up their changes before it reads."""
+
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75, snippet_chars: int = 300,
+                 max_content_chars: int = 20000):
+        self.log = module_logger.getChild(KnowledgeBase.__name__)
+        self.k1 = k1
+        self.b = b
+        self.snippet_chars = snippet_chars
+        self.max_content_chars = max_content_chars
+        self._lock = ReadWriteLock()
+        self._entries: dict[int, Entry] = {}
+        # term -> {entry id: term frequency}
+        self._postings: dict[str, dict[int, int]] = {}
+        self._lengths: dict[int, int] = {}
+        # term -> tier_count impact tiers of [entry ids, max tf, min length], for terms in many entries
+        self._tiers: dict[str, list[list]] = {}
+        self._total_length = 0
+        self._next_id = 1
+        self._version = 0
+        self._disk = None
+        self._disk_lock = Lock()
+        if path is not None:
+            # autocommit, so _save can open its own immediate transactions
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("pragma journal_mode=wal")
+            self._disk.executescript(schema)
+            self._disk.commit()
+            self._sync()
+
+    def add(self, title: str, content: str, author: str, tags: list[str] = None) -> Entry:
+        self._check(title, content)
+        now = datetime.now()
+        entry = Entry(None, title.strip(), content, sorted(set(tags or [])), author, now, now)
+        self._lock.acquire_write()
+        try:
+            self._sync_locked()
+            if self._disk is not None:
+                entry.id = self._save(entry, new=True)
+            else:
+                entry.id = self._next_id
+                self._next_id += 1
+            self._index(entry)
+        finally:
+            self._lock.release_write()
+        return entry
+
+    def update(self, entry_id: int, author: str, content: str = None, title: str = None,
+               tags: list[str] = None) -> Entry:
+        self._lock.acquire_write()
+        try:
+            self._sync_locked()
+            old = self._entries.get(entry_id)
+            if old is None:
+                raise KnowledgeBaseError(f"no entry with id {entry_id}")
+            entry = Entry(entry_id, title.strip() if title is not None else old.title,
+                          content if content is not None else old.content,
+                          sorted(set(tags)) if tags is not None else old.tags, author, old.created, datetime.now())
+            self._check(entry.title, entry.content)
+            if self._disk is not None:
+                self._save(entry, new=False)
+            self._unindex(old)
+            self._index(entry)
+        finally:
+            self._lock.release_write()
+        return entry
+
+    def get(self, entry_id: int) -> Entry | None:
+        self._sync()
+        self._lock.acquire_read()
+        try:
+            return self._entries.get(entry_id)
+        finally:
+            self._lock.release_read()
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[Entry, float, str]]:
+        """The best ``limit`` entries for ``query`` as (entry, score, snippet), best first."""
+        terms = set(tokenize(query))
+        self._sync()
+        self._lock.acquire_read()
+        try:
+            best = self._rank(terms, limit)
+            results = [(self._entries[entry_id], score) for entry_id, score in best]
+        finally:
+            self._lock.release_read()
+        return [(entry, score, self.snippet(entry.content, terms)) for entry, score in results]
+
+    def _rank(self, terms: set[str], limit: int) -> list[tuple[int, float]]:
+        """Exact BM25 top ``limit`` without scanning every posting of the common terms.
+
+        Terms are scanned rarest first. Once the ``limit``-th best score so far beats the most any other entry
+        could still gain (max-score pruning), the remaining terms are only looked up for the candidates found.
+        Terms with long posting lists also keep their entries in impact tiers, so when only such terms are left
+        their tiers are visited best first until no unvisited entry can make the top ``limit``."""
+        count = len(self._entries)
+        if not terms or count == 0:
+            return []
+        k1 = self.k1
+        # BM25 length normalization, k1 * (1 - b + b * length / average), as base + per_token * length
+        base = k1 * (1 - self.b)
+        # entries made only of stopwords have no length
+        per_token = k1 * self.b * count / max(1, self._total_length)
+        lengths = self._lengths
+        weighted = sorted(((term, postings, math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)))
+                           for term, postings in ((term, self._postings.get(term)) for term in terms) if postings),
+                          key=lambda t: len(t[1]))
+        # a term adds less than idf * (k1 + 1) to any entry's score
+        remaining = [0.0] * (len(weighted) + 1)
+        for i in range(len(weighted) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + weighted[i][2] * (k1 + 1)
+
+        def score(entry_id: int) -> float:
+            total = 0.0
+            norm = base + per_token * lengths[entry_id]
+            for _, postings, idf in weighted:
+                tf = postings.get(entry_id)
+                if tf is not None:
+                    total += idf * tf * (k1 + 1) / (tf + norm)
+            return total
+
+        def kth(scores: dict) -> float:
+            return heapq.nlargest(limit, scores.values())[-1] if len(scores) >= limit else 0.0
+
+        scores = {}
+        for i, (term, postings, idf) in enumerate(weighted):
+            if len(scores) >= limit and len(postings) > len(scores) and kth(scores) >= remaining[i]:
+                scores = {entry_id: score(entry_id) for entry_id in scores}
+                break
+            if all(term in self._tiers for term, _, _ in weighted[i:]):
+                scores = {entry_id: score(entry_id) for entry_id in scores}
+                self._visit_tiers(weighted[i:], scores, score, kth, base, per_token)
+                break
+            get = scores.get
+            for entry_id, tf in postings.items():
+                scores[entry_id] = get(entry_id, 0.0) + idf * tf * (k1 + 1) / (tf + base + per_token * lengths[entry_id])
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _visit_tiers(self, weighted: list, scores: dict, score: any, kth: any, base: float, per_token: float):
+        """Add entries of the tiered ``weighted`` terms to ``scores`` until the rest cannot make the top."""
+        queues = []
+        for term, _, idf in weighted:
+            tiers = [(idf * (self.k1 + 1) * max_tf / (max_tf + base + per_token * min_length), ids)
+                     for ids, max_tf, min_length in self._tiers[term] if ids]
+            tiers.sort(key=lambda tier: tier[0], reverse=True)
+            queues.append(tiers)
+        positions = [0] * len(queues)
+        while True:
+            # an unvisited entry is at best in the next tier of every term
+            bounds = [queue[position][0] if position < len(queue) else 0.0
+                      for queue, position in zip(queues, positions)]
+            if not any(bounds) or kth(scores) >= sum(bounds):
+                return
+            best = bounds.index(max(bounds))
+            for entry_id in queues[best][positions[best]][1]:
+                if entry_id not in scores:
+                    scores[entry_id] = score(entry_id)
+            positions[best] += 1
+
+    def snippet(self, content: str, terms: set[str]) -> str:
+        """Up to ``snippet_chars`` of ``content`` around the first query term found in it."""
+        if len(content) <= self.snippet_chars:
+            return content
+        lowered = content.lower()
+        found = [m.start() for m in (re.search(rf"\b{re.escape(term)}", lowered) for term in terms) if m]
+        start = max(0, min(found) - self.snippet_chars // 4) if found else 0
+        start = min(start, len(content) - self.snippet_chars)
+        text = content[start:start + self.snippet_chars]
+        return ("..." if start > 0 else "") + text + ("..." if start + self.snippet_chars < len(content) else "")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        self._lock.acquire_read()
+        try:
+            return {"entries": len(self._entries), "terms": len(self._postings),
+                    "average_length": self._total_length / len(self._entries) if self._entries else 0.0}
+        finally:
+            self._lock.release_read()
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+    def _check(self, title: str, content: str):
+        if not title.strip():
+            raise KnowledgeBaseError("title is required")
+        if len(content) > self.max_content_chars:
+            raise KnowledgeBaseError(f"content is {len(content)} characters, the limit is {self.max_content_chars}; "
+                                     f"split it into several entries")
+
+    def _index(self, entry: Entry):
+        terms = Counter(tokenize(entry.text()))
+        length = sum(terms.values())
+        self._lengths[entry.id] = length
+        self._total_length += length
+        self._entries[entry.id] = entry
+        for term, tf in terms.items():
+            postings = self._postings.setdefault(term, {})
+            postings[entry.id] = tf
+            if term in self._tiers:
+                self._tier_add(term, entry.id, tf, length)
+            elif len(postings) >= tier_threshold:
+                self._tiers[term] = [[set(), 0, None] for _ in range(tier_count)]
+                for entry_id, tf in postings.items():
+                    self._tier_add(term, entry_id, tf, self._lengths[entry_id])
+
+    def _tier_add(self, term: str, entry_id: int, tf: int, length: int):
+        # group by impact at today's average length; the bounds use each tier's own max tf and min length, so
+        # they stay valid as the average drifts
+        impact = tf / (tf + self.k1 * (1 - self.b + self.b * length * len(self._entries) / max(1, self._total_length)))
+        tier = self._tiers[term][min(tier_count - 1, int(impact * tier_count))]
+        tier[0].add(entry_id)
+        tier[1] = max(tier[1], tf)
+        tier[2] = length if tier[2] is None else min(tier[2], length)
+
+    def _unindex(self, entry: Entry):
+        for term in set(tokenize(entry.text())):
+            postings = self._postings[term]
+            del postings[entry.id]
+            if not postings:
+                del self._postings[term]
+                self._tiers.pop(term, None)
+            elif term in self._tiers:
+                for ids, _, _ in self._tiers[term]:
+                    ids.discard(entry.id)
+        self._total_length -= self._lengths.pop(entry.id)
+        del self._entries[entry.id]
+
+    def _save(self, entry: Entry, new: bool) -> int:
+        row = (entry.title, entry.content, ",".join(entry.tags), entry.author, entry.created.isoformat(),
+               entry.updated.isoformat())
+        with self._disk_lock:
+            with self._disk:
+                # take the write lock before reading the version, so concurrent writers in other processes get
+                # distinct versions and commit them in order
+                self._disk.execute("begin immediate")
+                version = self._disk.execute("select coalesce(max(version), 0) + 1 from kb_entries").fetchone()[0]
+                if new:
+                    entry_id = self._disk.execute("insert into kb_entries (title, content, tags, author, created, "
+                                                  "updated, version) values (?, ?, ?, ?, ?, ?, ?)",
+                                                  row + (version,)).lastrowid
+                else:
+                    entry_id = entry.id
+                    self._disk.execute("update kb_entries set title = ?, content = ?, tags = ?, author = ?, "
+                                       "created = ?, updated = ?, version = ? where id = ?",
+                                       row + (version, entry_id))
+        # our own write needs no re-read unless another process wrote in between
+        if version == self._version + 1:
+            self._version = version
+        return entry_id
+
+    def _sync(self):
+        """Index entries that other processes added or changed since we last looked."""
+        if self._disk is None or not self._changed():
+            return
+        self._lock.acquire_write()
+        try:
+            self._sync_locked()
+        finally:
+            self._lock.release_write()
+
+    def _changed(self) -> bool:
+        with self._disk_lock:
+            row = self._disk.execute("select max(version) from kb_entries").fetchone()
+        return (row[0] or 0) > self._version
+
+    def _sync_locked(self):
+        if self._disk is None:
+            return
+        with self._disk_lock:
+            rows = self._disk.execute("select id, title, content, tags, author, created, updated, version "
+                                      "from kb_entries where version > ? order by version", (self._version,)).fetchall()
+        for id, title, content, tags, author, created, updated, version in rows:
+            old = self._entries.get(id)
+            if old is not None:
+                self._unindex(old)
+            self._index(Entry(id, title, content, tags.split(",") if tags else [], author,
+                              datetime.fromisoformat(created), datetime.fromisoformat(updated)))
+            self._version = version
+        if rows:
+            self.log.info(f"indexed {len(rows)} changed entries")
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+from collections import Counter
+from datetime import datetime
+from threading import Lock
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr, root_validator
+from langchain_core.tools import BaseTool
+
+from AaronsAgents.telemetry import model_name, telemetry
+
+module_logger = logging.getLogger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+PASSTHROUGH = "passthrough"
+modes = (RECORD, REPLAY, PASSTHROUGH)
+
+# parts of a prompt that change from run to run without changing its meaning
+volatile_patterns = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?"), "<time>"),
+]
+
+schema = """
+create table if not exists llm_responses (
+    key text not null,
+    seq integer not null,
+    model text not null,
+    response text not null,
+    recorded text not null,
+    primary key (key, seq)
+);
+"""
+
+
+class ReplayMiss(Exception):
+    pass
+
+
+def mask(text: str) -> str:
+    for pattern, replacement in volatile_patterns:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def normalize(value: Any) -> Any:
+    """A JSON-able form of a prompt, with volatile text masked and provider noise dropped."""
+    if isinstance(value, str):
+        return mask(value)
+    if isinstance(value, BaseMessage):
+        ret = {"type": value.type, "content": normalize(value.content)}
+        if getattr(value, "tool_calls", None):
+            ret["tool_calls"] = normalize([{"name": c["name"], "args": c["args"], "id": c["id"]}
+                                           for c in value.tool_calls])
+        if getattr(value, "tool_call_id", None):
+            ret["tool_call_id"] = value.tool_call_id
+        return ret
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return mask(str(value))
+
+
+def prompt_key(model: str, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict) -> str:
+    """Hash of everything that decides a response: model, messages (system prompt, history, input), stop
+    sequences and request kwargs such as bound tool schemas or Anthropic system blocks."""
+    prompt = {"model": model, "messages": normalize(messages), "stop": stop, "kwargs": normalize(kwargs)}
+    return hashlib.sha256(json.dumps(prompt, sort_keys=True).encode()).hexdigest()
+
+
+def dump_result(result: ChatResult) -> str:
+    return json.dumps({
+        "generations": [{"message": message_to_dict(g.message), "generation_info": g.generation_info}
+                        for g in result.generations],
+        "llm_output": result.llm_output,
+    }, default=str)
+
+
+def load_result(text: str) -> ChatResult:
+    data = json.loads(text)
+    generations = [ChatGeneration(message=messages_from_dict([g["message"]])[0],
+                                  generation_info=g["generation_info"]) for g in data["generations"]]
+    return ChatResult(generations=generations, llm_output=data["llm_output"])
+
+
+class ResponseStore:
+    """Recorded chat model responses, by prompt key and occurrence.
+
+    A prompt that comes up several times in a run is recorded once per occurrence, so a replay sees the same
+    sequence of responses; past the last recorded occurrence the last response is repeated. Everything is held
+    in memory, and with ``path`` also in a SQLite file that is loaded at start."""
+
+    def __init__(self, path: str = None):
+        self.log = module_logger.getChild(ResponseStore.__name__)
+        self._lock = Lock()
+        # key -> {occurrence: response}
+        self._responses: dict[str, dict[int, str]] = {}
+        self._served = Counter()
+        self._disk = None
+        if path is not None:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute("pragma journal_mode=wal")
+            self._disk.executescript(schema)
+            for key, seq, response in self._disk.execute("select key, seq, response from llm_responses"):
+                self._responses.setdefault(key, {})[seq] = response
+            self.log.info(f"loaded {len(self)} responses from {path}")
+
+    def take(self, key: str) -> tuple[int, str | None, bool]:
+        """(occurrence, recorded response or None, whether the key was recorded at all) for the next use."""
+        with self._lock:
+            seq = self._served[key]
+            self._served[key] += 1
+            responses = self._responses.get(key)
+            if not responses:
+                return seq, None, False
+            return seq, responses.get(seq), True
+
+    def last(self, key: str) -> str:
+        with self._lock:
+            responses = self._responses[key]
+            return responses[max(responses)]
+
+    def add(self, key: str, seq: int, model: str, response: str):
+        with self._lock:
+            self._responses.setdefault(key, {})[seq] = response
+            if self._disk is not None:
+                with self._disk:
+                    self._disk.execute("insert or replace into llm_responses values (?, ?, ?, ?, ?)",
+                                       (key, seq, model, response, datetime.now().isoformat()))
+
+    def rewind(self):
+        """Start the next run's occurrence count from the first recorded response again."""
+        with self._lock:
+            self._served.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(map(len, self._responses.values()))
+
+    def close(self):
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+
+class RecordReplayChatModel(BaseChatModel):
+    """Wraps a chat model with a ResponseStore.
+
+    ``record`` serves responses already in the store and calls the wrapped model (and records its answer)
+    otherwise, ``replay`` never calls it and raises ReplayMiss for an unknown prompt, and ``passthrough``
+    always calls it and only counts how often the store would have answered. Prompts are keyed with
+    ``prompt_key()``, so timestamps in the system prompt and stimuli do not defeat the cache. Callbacks see
+    every call as usual, replays included."""
+
+    inner: Any
+    store: Any
+    mode: str = RECORD
+    model: str = ""
+    _lock: Lock = PrivateAttr(default_factory=Lock)
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    @root_validator(pre=True)
+    def fill_model(cls, values: dict) -> dict:
+        if values.get("mode", RECORD) not in modes:
+            raise ValueError(f"mode must be one of {', '.join(modes)}")
+        values.setdefault("model", model_name(values["inner"]))
+        return values
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{self.mode}:{self.inner._llm_type}"
+
+    def bind_tools(self, tools: Sequence[BaseTool], **kwargs: Any):
+        # bind the wrapped model's own request kwargs (tool schemas etc.) so they reach _generate and the key
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        key = prompt_key(self.model, messages, stop, kwargs)
+        seq, response, known = self.store.take(key)
+        if response is None and known and self.mode == REPLAY:
+            response = self.store.last(key)
+        self._count(response is not None)
+        if response is not None and self.mode != PASSTHROUGH:
+            return load_result(response)
+        if self.mode == REPLAY:
+            last = messages[-1].content if messages else ""
+            raise ReplayMiss(f"no recorded response from {self.model} for prompt {key[:12]} "
+                             f"(last message: {str(last)[:200]!r})")
+        result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if self.mode == RECORD:
+            self.store.add(key, seq, self.model, dump_result(result))
+        return result
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+        telemetry.inc("aagents_llm_cache_total", model=self.model, mode=self.mode, result="hit" if hit else "miss")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        return {"mode": self.mode, "hits": hits, "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0, "recorded": len(self.store)}
+
+
+def unwrap(model: Any) -> Any:
+    """The provider model behind a RecordReplayChatModel, for checks such as Anthropic-only features."""
+    return model.inner if isinstance(model, RecordReplayChatModel) else model
@@ -0,0 +1,131 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from AaronsAgents.rate_limiter import estimate_tokens
+
+module_logger = logging.getLogger(__name__)
+
+# compaction runs here, off the agents' turn threads
+compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="HistoryCompaction")
+
+
+class AgentMemory(BaseChatMessageHistory):
+    """Chat history for one agent, bounded by an estimated token budget instead of a message count.
+
+    When the history grows past ``token_budget`` the oldest messages are compacted in the background. They are
+    folded into a running summary by ``summarize(previous_summary, messages)`` or, without a summarizer,
+    dropped. The summary is presented to the model as the first message. If compaction falls behind and the
+    history reaches twice the budget, the oldest messages are dropped on the spot so the prompt stays bounded."""
+
+    def __init__(self, token_budget: int = 8000, summarize: Callable[[str, list[BaseMessage]], str] = None,
+                 name: str = ""):
+        self.log = module_logger.getChild(f"{AgentMemory.__name__}({name})")
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.summary = ""
+        self._lock = Lock()
+        self._messages = []
+        self._tokens = {}
+        self._total = 0
+        self._compacting = False
+        self._generation = 0
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        with self._lock:
+            if self.summary:
+                return [HumanMessage(content=f"Summary of your earlier experience (older history has been "
+                                             f"compacted):\n{self.summary}")] + self._messages
+            return list(self._messages)
+
+    @property
+    def tokens(self) -> int:
+        return self._total
+
+    def messages_only(self) -> list[BaseMessage]:
+        """The retained messages, without the summary."""
+        with self._lock:
+            return list(self._messages)
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            for message in messages:
+                tokens = estimate_tokens([message])
+                self._messages.append(message)
+                self._tokens[id(message)] = tokens
+                self._total += tokens
+            if self._total > 2 * self.token_budget:
+                self._drop_oldest(self.token_budget)
+            if self._total > self.token_budget and not self._compacting:
+                self._compacting = True
+                compaction_executor.submit(self._compact, self._generation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages = []
+            self._tokens = {}
+            self._total = 0
+            self.summary = ""
+            self._generation += 1
+
+    def restore(self, summary: str, messages: list[BaseMessage]):
+        self.clear()
+        with self._lock:
+            self.summary = summary
+        self.add_messages(messages)
+
+    def _oldest_over(self, target: int) -> list[BaseMessage]:
+        """The oldest messages that must go to bring the history down to ``target`` tokens. Stops on a message
+        boundary that leaves the history starting with a human message."""
+        total = self._total
+        count = 0
+        while count < len(self._messages) and (total > target or
+                                               (count > 0 and not isinstance(self._messages[count], HumanMessage))):
+            total -= self._tokens[id(self._messages[count])]
+            count += 1
+        return self._messages[:count]
+
+    def _remove(self, messages: list[BaseMessage]):
+        gone = set(id(m) for m in messages)
+        for message in messages:
+            self._total -= self._tokens.pop(id(message), 0)
+        self._messages = [m for m in self._messages if id(m) not in gone]
+
+    def _drop_oldest(self, target: int):
+        dropped = self._oldest_over(target)
+        self._remove(dropped)
+        self.log.info(f"dropped {len(dropped)} messages to stay under the history budget")
+
+    def _compact(self, generation: int):
+        try:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                previous = self.summary
+                oldest = self._oldest_over(self.token_budget // 2)
+            if not oldest:
+                return
+            summary = previous
+            if self.summarize is not None:
+                try:
+                    # the summary can't be allowed to grow without bound either
+                    summary = self.summarize(previous, oldest)[:self.token_budget]
+                except Exception as e:
+                    self.log.exception(e)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.summary = summary
+                self._remove(oldest)
+            self.log.info(f"compacted {len(oldest)} messages, {self._total} tokens remain")
+        finally:
+            with self._lock:
+                self._compacting = False
@@ -0,0 +1,197 @@
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from threading import Thread, Lock, Event, Condition
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+module_logger = logging.getLogger(__name__)
+
+MEMBER = "member"
+QUEUE = "queue"
+HISTORY = "history"
+
+schema = """
+create table if not exists members (
+    name text primary key,
+    manager text,
+    rank integer not null,
+    title text not null,
+    personality text not null,
+    job text not null,
+    model text,
+    sub_model text,
+    notepad text not null,
+    idle_sleep_seconds integer not null,
+    presence text not null,
+    status text not null,
+    status_updated text not null
+);
+create table if not exists stimuli (
+    member text not null,
+    seq integer not null,
+    type text not null,
+    detail text not null,
+    ts text not null,
+    primary key (member, seq)
+);
+create table if not exists histories (
+    member text primary key,
+    summary text not null,
+    messages text not null
+);
+"""
+
+
+class OrgStore:
+    """Durable snapshot of the org in a local SQLite database.
+
+    Team members mark themselves dirty as their state changes. A writer thread flushes only the dirty parts
+    (member row, stimulus queue or history) every ``flush_interval`` seconds in one transaction. ``restore()``
+    rebuilds the hierarchy from the database. ``models`` maps a stable key to each model instance so that
+    restored members get back the same ``model``/``sub_model``."""
+
+    def __init__(self, path: str, models: dict, flush_interval: float = 0.5):
+        self.log = module_logger.getChild(OrgStore.__name__)
+        self.path = path
+        self.models = models
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        self._conn.executescript(schema)
+        self._lock = Lock()
+        self._flushed = Condition(self._lock)
+        self._requested = 0
+        self._completed = 0
+        self._dirty = {}
+        self._forgotten = set()
+        self._wake = Event()
+        self._running = True
+        self.thread = Thread(target=self._writer, name="OrgStore", daemon=True)
+        self.thread.start()
+
+    def model_key(self, model: any) -> str | None:
+        for key, candidate in self.models.items():
+            if candidate is model:
+                return key
+        return None
+
+    def mark(self, member: any, *kinds: str):
+        with self._lock:
+            self._forgotten.discard(member.name)
+            entry = self._dirty.get(member.name)
+            if entry is None or entry[0] is not member:
+                entry = self._dirty[member.name] = (member, set())
+            entry[1].update(kinds)
+
+    def forget(self, member: any):
+        """Delete a fired member's state."""
+        with self._lock:
+            self._dirty.pop(member.name, None)
+            self._forgotten.add(member.name)
+        self._wake.set()
+
+    def flush(self, timeout: float = 10):
+        """Write everything dirty now and wait for it to land."""
+        with self._lock:
+            self._requested += 1
+            target = self._requested
+            self._wake.set()
+            self._flushed.wait_for(lambda: self._completed >= target, timeout)
+
+    def close(self):
+        self.flush()
+        self._running = False
+        self._wake.set()
+        self.thread.join()
+        self._conn.close()
+
+    def _writer(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with self._lock:
+                target = self._requested
+            try:
+                self._write()
+            except Exception as e:
+                self.log.exception(e)
+            with self._lock:
+                self._completed = target
+                self._flushed.notify_all()
+
+    def _write(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            forgotten, self._forgotten = self._forgotten, set()
+        if not dirty and not forgotten:
+            return
+        member_rows, stimuli_rows, history_rows, cleared = [], [], [], []
+        for name, (member, kinds) in dirty.items():
+            if MEMBER in kinds:
+                member_rows.append((member.name, member.manager.name if member.manager is not None else None,
+                                    member.rank, member.title, member.personality, member.job,
+                                    self.model_key(member.model), self.model_key(member.sub_model),
+                                    member.notepad, member.idle_sleep_seconds, member.messaging_presence,
+                                    member.messaging_status, member.messaging_updated.isoformat()))
+            if QUEUE in kinds:
+                cleared.append((name,))
+                stimuli_rows.extend((name, seq, stim.type, stim.detail, stim.ts.isoformat())
+                                    for seq, stim in enumerate(member.stimulus_queue))
+            if HISTORY in kinds:
+                history = member.chat_history
+                history_rows.append((name, history.summary, json.dumps(messages_to_dict(history.messages_only()))))
+        with self._conn:
+            self._conn.executemany("delete from members where name = ?", [(n,) for n in forgotten])
+            self._conn.executemany("delete from stimuli where member = ?", [(n,) for n in forgotten] + cleared)
+            self._conn.executemany("delete from histories where member = ?", [(n,) for n in forgotten])
+            self._conn.executemany("insert or replace into members values (?,?,?,?,?,?,?,?,?,?,?,?,?)", member_rows)
+            self._conn.executemany("insert into stimuli values (?,?,?,?,?)", stimuli_rows)
+            self._conn.executemany("insert or replace into histories values (?,?,?)", history_rows)
+
+    def restore(self, before_start_callback: any = None) -> list:
+        """Recreate every stored team member, managers before their reports, and resume scheduling them."""
+        from AaronsAgents.team_member import TeamMember, Stimulus
+        rows = self._conn.execute("select name, manager, rank, title, personality, job, model, sub_model, notepad, "
+                                  "idle_sleep_seconds, presence, status, status_updated from members "
+                                  "order by rank").fetchall()
+        stimuli = {}
+        for member, stim_type, detail, ts in self._conn.execute(
+                "select member, type, detail, ts from stimuli order by member, seq"):
+            stimuli.setdefault(member, []).append(Stimulus(stim_type, detail, datetime.fromisoformat(ts)))
+        histories = {member: (summary, messages) for member, summary, messages in
+                     self._conn.execute("select member, summary, messages from histories")}
+
+        restored = {}
+        for (name, manager, rank, title, personality, job, model, sub_model, notepad, idle_sleep_seconds,
+             presence, status, status_updated) in rows:
+            if manager is not None and manager not in restored:
+                self.log.warning(f"skipping {name}: manager {manager} was not restored")
+                continue
+            if model not in self.models:
+                self.log.warning(f"{name}: no model registered under {model!r}")
+
+            def apply_state(member, notepad=notepad, idle_sleep_seconds=idle_sleep_seconds, presence=presence,
+                            status=status, status_updated=status_updated, name=name):
+                member.notepad = notepad
+                member.idle_sleep_seconds = idle_sleep_seconds
+                member.messaging_presence = presence
+                member.messaging_status = status
+                member.messaging_updated = datetime.fromisoformat(status_updated)
+                member.stimulus_queue.drain()
+                for stim in stimuli.get(name, []):
+                    member.stimulus_queue.put(stim)
+                if name in histories:
+                    summary, messages = histories[name]
+                    member.chat_history.restore(summary, messages_from_dict(json.loads(messages)))
+                if before_start_callback is not None:
+                    before_start_callback(member)
+
+            restored[name] = TeamMember(name=name, personality=personality, title=title, job_description=job,
+                                        rank=rank, model=self.models.get(model),
+                                        manager=restored[manager] if manager is not None else None,
+                                        sub_model=self.models.get(sub_model), before_start_callback=apply_state)
+        self.log.info(f"restored {len(restored)} team members from {self.path}")
+        return list(restored.values())
@@ -0,0 +1,241 @@
+import heapq
+import logging
+from collections import deque
+from threading import Lock, Condition
+from time import monotonic
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+module_logger = logging.getLogger(__name__)
+
+# lower value = served first
+# later calls of a turn that is already running; served first because the turn holds a scheduler worker
+PRIORITY_IN_TURN = -1
+PRIORITY_AARON = 0
+PRIORITY_DIRECTOR = 1
+PRIORITY_MESSAGE = 2
+PRIORITY_TIME = 3
+
+window_seconds = 60
+
+
+class ModelLimits:
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None, max_in_flight: int = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_in_flight = max_in_flight
+
+
+class _ModelState:
+    def __init__(self, model: any, limits: ModelLimits, lock: Lock):
+        self.model = model
+        self.limits = limits
+        self.cond = Condition(lock)
+        self.in_flight = 0
+        self.requests = deque()
+        self.tokens = deque()
+        self.token_total = 0
+        self.blocked_until = 0.0
+        self.waiting = []
+
+
+class Ticket:
+    def __init__(self, state: _ModelState, entry: list, agent: str, requested: float, waited: float):
+        self.state = state
+        self.entry = entry
+        self.agent = agent
+        self.requested = requested
+        self.waited = waited
+        self.released = False
+
+
+class RateLimiter:
+    """Shared limiter for LLM calls, keyed by model instance.
+
+    Enforces requests-per-minute, tokens-per-minute and max-in-flight limits per model. Waiting callers are
+    served strictly in priority order, then arrival order. Models that were never configured are not
+    limited, but their queueing delay is still recorded."""
+
+    def __init__(self):
+        self.log = module_logger.getChild(RateLimiter.__name__)
+        self._lock = Lock()
+        self._models = {}
+        self._seq = 0
+        self._delays = {}
+
+    def configure(self, model: any, requests_per_minute: int = None, tokens_per_minute: int = None,
+                  max_in_flight: int = None):
+        with self._lock:
+            self._state(model).limits = ModelLimits(requests_per_minute, tokens_per_minute, max_in_flight)
+
+    def acquire(self, model: any, agent: str, priority: int = PRIORITY_MESSAGE, estimated_tokens: int = 0,
+                record: bool = True) -> Ticket:
+        """Block until a call to ``model`` is allowed, then reserve it. Must be paired with ``release()``.
+
+        With ``record=False`` the wait is not counted yet: the ticket admits a turn that still has to get a
+        worker, and ``start()`` counts the whole wait once its first call actually begins."""
+        start = monotonic()
+        with self._lock:
+            state = self._state(model)
+            self._seq += 1
+            me = (priority, self._seq)
+            heapq.heappush(state.waiting, me)
+            while True:
+                now = monotonic()
+                self._prune(state, now)
+                delay = self._delay(state, estimated_tokens, now)
+                if state.waiting[0] == me and delay == 0:
+                    break
+                state.cond.wait(delay if state.waiting[0] == me else None)
+            heapq.heappop(state.waiting)
+            now = monotonic()
+            state.in_flight += 1
+            state.requests.append(now)
+            entry = [now, estimated_tokens]
+            state.tokens.append(entry)
+            state.token_total += estimated_tokens
+            waited = now - start
+            if record:
+                self._record(model, agent, waited)
+            # the next waiter may be admissible as well
+            state.cond.notify_all()
+        if waited > 1:
+            self.log.info(f"{agent} waited {waited:.1f}s for {type(model).__name__}")
+        return Ticket(state, entry, agent, start, waited)
+
+    def start(self, ticket: Ticket, estimated_tokens: int = None):
+        """Begin the call reserved by an admission ticket, counting the wait from admission request to now."""
+        with self._lock:
+            if estimated_tokens is not None:
+                ticket.state.token_total += estimated_tokens - ticket.entry[1]
+                ticket.entry[1] = estimated_tokens
+            ticket.waited = monotonic() - ticket.requested
+            self._record(ticket.state.model, ticket.agent, ticket.waited)
+
+    def _record(self, model: any, agent: str, waited: float):
+        # telemetry imports this module for token_usage
+        from AaronsAgents.telemetry import telemetry, model_name
+        count, total, longest = self._delays.get(agent, (0, 0.0, 0.0))
+        self._delays[agent] = (count + 1, total + waited, max(longest, waited))
+        telemetry.observe("aagents_rate_limit_wait_seconds", waited, agent=agent, model=model_name(model))
+
+    def release(self, ticket: Ticket, actual_tokens: int = None, retry_after: float = None):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            state = ticket.state
+            state.in_flight -= 1
+            if actual_tokens is not None:
+                state.token_total += actual_tokens - ticket.entry[1]
+                ticket.entry[1] = actual_tokens
+            if retry_after is not None:
+                state.blocked_until = max(state.blocked_until, monotonic() + retry_after)
+            state.cond.notify_all()
+
+    def queueing_delay(self) -> dict:
+        """Per agent: (calls, total seconds waited, longest wait)."""
+        with self._lock:
+            return dict(self._delays)
+
+    def in_flight(self, model: any) -> int:
+        with self._lock:
+            state = self._models.get(id(model))
+            return state.in_flight if state is not None else 0
+
+    def _state(self, model: any) -> _ModelState:
+        state = self._models.get(id(model))
+        if state is None or state.model is not model:
+            state = _ModelState(model, ModelLimits(), self._lock)
+            self._models[id(model)] = state
+        return state
+
+    @staticmethod
+    def _prune(state: _ModelState, now: float):
+        horizon = now - window_seconds
+        while state.requests and state.requests[0] <= horizon:
+            state.requests.popleft()
+        while state.tokens and state.tokens[0][0] <= horizon:
+            state.token_total -= state.tokens.popleft()[1]
+
+    @staticmethod
+    def _delay(state: _ModelState, estimated_tokens: int, now: float) -> float | None:
+        """Seconds until a call could start, 0 if it can start now, or None if it must wait for a release."""
+        limits = state.limits
+        if state.blocked_until > now:
+            return state.blocked_until - now
+        if limits.max_in_flight is not None and state.in_flight >= limits.max_in_flight:
+            return None
+        if limits.requests_per_minute is not None and len(state.requests) >= limits.requests_per_minute:
+            return state.requests[0] + window_seconds - now
+        if (limits.tokens_per_minute is not None and state.tokens and
+                state.token_total + estimated_tokens > limits.tokens_per_minute):
+            return state.tokens[0][0] + window_seconds - now
+        return 0
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    # ~4 characters per token is close enough for admission control; actual usage is reconciled on release
+    return sum(len(str(m.content)) for m in messages) // 4
+
+
+def token_usage(response: LLMResult) -> tuple[int, int] | None:
+    """(input, output) tokens reported by the provider: Anthropic reports ``usage``, OpenAI ``token_usage``."""
+    output = response.llm_output or {}
+    usage = output.get("usage") or output.get("token_usage")
+    if not usage:
+        return None
+    if "prompt_tokens" in usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+
+def usage_tokens(response: LLMResult) -> int | None:
+    usage = token_usage(response)
+    return sum(usage) if usage is not None else None
+
+
+class RateLimitCallback(BaseCallbackHandler):
+    """Gates every chat model call made during a turn through a RateLimiter.
+
+    With an ``admission`` ticket (see AgentScheduler) the first call uses it instead of waiting again, and
+    later calls of the turn go ahead of turns that have not started yet."""
+
+    raise_error = True
+
+    def __init__(self, limiter: RateLimiter, model: any, agent: str, priority: int, admission: Ticket = None):
+        self.limiter = limiter
+        self.model = model
+        self.agent = agent
+        self.priority = priority
+        self.admission = admission
+        # later calls of an admitted turn hold a worker while they wait
+        self.in_turn_priority = PRIORITY_IN_TURN if admission is not None else priority
+        self.tickets = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list[list[BaseMessage]], *, run_id: UUID,
+                            **kwargs: Any) -> Any:
+        estimate = sum(estimate_tokens(m) for m in messages)
+        if self.admission is not None:
+            ticket, self.admission = self.admission, None
+            self.limiter.start(ticket, estimate)
+            self.tickets[run_id] = ticket
+            return
+        self.tickets[run_id] = self.limiter.acquire(self.model, self.agent, self.in_turn_priority, estimate)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        ticket = self.tickets.pop(run_id, None)
+        if ticket is not None:
+            self.limiter.release(ticket, usage_tokens(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        ticket = self.tickets.pop(run_id, None)
+        if ticket is not None:
+            retry_after = None
+            if "RateLimit" in type(error).__name__:
+                retry_after = float(getattr(getattr(error, "response", None), "headers", {}).get("retry-after", 20))
+            self.limiter.release(ticket, retry_after=retry_after)
@@ -0,0 +1,75 @@
+from threading import RLock
+
+
+class TeamRegistry:
+    """Thread-safe index of hired team members by name and by manager.
+
+    Members are keyed by name, and by their manager's name for the reporting tree (``None`` means the member
+    reports to Aaron). ``version`` is bumped on every hire, fire and ``touch()`` so that renderers can cache
+    anything derived from the org."""
+
+    def __init__(self):
+        self._lock = RLock()
+        self._members = {}
+        self._reports = {}
+        self.version = 0
+
+    @staticmethod
+    def manager_key(member: any) -> str | None:
+        return member.manager.name if member.manager is not None else None
+
+    def add(self, member: any):
+        with self._lock:
+            if member.name in self._members:
+                raise Exception(f"Team member **{member.name}** already exists")
+            self._members[member.name] = member
+            self._reports.setdefault(self.manager_key(member), {})[member.name] = member
+            self.version += 1
+
+    def remove(self, member: any) -> bool:
+        with self._lock:
+            if self._members.get(member.name) is not member:
+                return False
+            del self._members[member.name]
+            key = self.manager_key(member)
+            reports = self._reports.get(key)
+            if reports is not None:
+                reports.pop(member.name, None)
+                if not reports:
+                    del self._reports[key]
+            self.version += 1
+            return True
+
+    def touch(self):
+        """Record a change to a member that shows up in contact lists (presence, status)."""
+        with self._lock:
+            self.version += 1
+
+    def get(self, name: str) -> any:
+        return self._members.get(name)
+
+    def reports(self, manager_name: str | None) -> list:
+        """Direct reports of the named manager; ``None`` for those reporting to Aaron."""
+        with self._lock:
+            return list(self._reports.get(manager_name, {}).values())
+
+    def contacts(self, member: any) -> list:
+        """The members ``member`` may contact per the handbook: manager, peers (including itself) and direct
+        reports."""
+        with self._lock:
+            key = self.manager_key(member)
+            manager = self._members.get(key) if key is not None else None
+            ret = [manager] if manager is not None else []
+            ret.extend(self._reports.get(key, {}).values())
+            ret.extend(self._reports.get(member.name, {}).values())
+            return ret
+
+    def __contains__(self, member: any) -> bool:
+        return self._members.get(member.name) is member
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._members.values()))
+
+    def __len__(self):
+        return len(self._members)
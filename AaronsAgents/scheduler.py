@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Thread, Lock
+from time import monotonic
+
+from AaronsAgents.budget import EXHAUSTED
+from AaronsAgents.telemetry import telemetry
+
+module_logger = logging.getLogger(__name__)
+
+
+class AgentScheduler:
+    """Runs team members as asyncio tasks on one event loop instead of one polling thread each.
+
+    Each agent task sleeps on a wake event that is set by ``stimulate()`` and on the loop's timer heap for
+    its idle timer, so an idle org costs no CPU. The blocking ``process()`` calls run on a small shared
+    worker pool; with a rate limiter, a turn is admitted by it before it takes a worker."""
+
+    def __init__(self, max_workers: int = 8):
+        self.log = module_logger.getChild(AgentScheduler.__name__)
+        self.max_workers = max_workers
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: Thread | None = None
+        self.pool: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+        self._pending = []
+        self._events = {}
+        self._tasks = {}
+
+    @property
+    def running(self) -> bool:
+        return self.loop is not None and self.loop.is_running()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="AgentWorker")
+        self.thread = Thread(target=self._run_loop, name="AgentScheduler", daemon=True)
+        self.thread.start()
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for agent in pending:
+            self.loop.call_soon_threadsafe(self._start_task, agent)
+
+    def stop(self, timeout: float = None):
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._cancel_all)
+        self.thread.join(timeout)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.loop = None
+        self.thread = None
+        self.pool = None
+
+    def add(self, agent: any):
+        """Schedule an agent. Safe to call from any thread, before or after ``start()``."""
+        with self._lock:
+            if self.loop is None:
+                self._pending.append(agent)
+                return
+        self.loop.call_soon_threadsafe(self._start_task, agent)
+
+    def remove(self, agent: any):
+        """Stop scheduling an agent. The agent's in-flight turn, if any, is allowed to finish."""
+        with self._lock:
+            if agent in self._pending:
+                self._pending.remove(agent)
+                return
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._cancel_task, agent)
+
+    def wake(self, agent: any):
+        """Wake a sleeping agent. Called from ``stimulate()`` on arbitrary threads."""
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._set_event, agent)
+        except RuntimeError:
+            # loop closed during shutdown
+            pass
+
+    def __len__(self):
+        return len(self._tasks) + len(self._pending)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _start_task(self, agent: any):
+        if agent in self._tasks:
+            return
+        self._events[agent] = asyncio.Event()
+        self._tasks[agent] = self.loop.create_task(self._agent_task(agent), name=f"Agent({agent.name})")
+
+    def _cancel_task(self, agent: any):
+        # the task removes itself from _tasks once the cancellation has been processed
+        task = self._tasks.get(agent)
+        if task is not None:
+            task.cancel()
+
+    def _cancel_all(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            gathered = asyncio.gather(*tasks, return_exceptions=True)
+            gathered.add_done_callback(lambda _: self.loop.stop())
+        else:
+            self.loop.stop()
+
+    def _set_event(self, agent: any):
+        event = self._events.get(agent)
+        if event is not None:
+            event.set()
+
+    async def _sleep_until(self, event: asyncio.Event, deadline: float, interruptible: bool):
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return
+        if not interruptible:
+            await asyncio.sleep(remaining)
+            return
+        try:
+            await asyncio.wait_for(event.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _admit(self, agent: any):
+        """Wait for the rate limiter to allow the turn's first model call before taking a worker, so turns
+        waiting on a saturated model cannot hold every worker. The limiter blocks, so it waits on a thread of
+        its own; the returned ticket is handed to ``process()``."""
+        from AaronsAgents import team_member
+        limiter = team_member.rate_limiter
+        if limiter is None:
+            return None
+        admitted = self.loop.create_future()
+
+        def deliver(ticket):
+            if admitted.cancelled():
+                # the task was cancelled while waiting
+                limiter.release(ticket)
+            else:
+                admitted.set_result(ticket)
+
+        def wait():
+            ticket = limiter.acquire(agent.model, agent.name, agent.turn_priority(), agent.estimate_turn_tokens(),
+                                     record=False)
+            try:
+                self.loop.call_soon_threadsafe(deliver, ticket)
+            except RuntimeError:
+                # loop closed during shutdown
+                limiter.release(ticket)
+
+        Thread(target=wait, name=f"Admit({agent.name})", daemon=True).start()
+        return await admitted
+
+    async def _run_turn(self, agent: any, admission: any):
+        """Run ``process()`` on a worker. Whichever side takes ``owner`` first owns the admission ticket: the
+        worker, which hands it to ``process()``, or this task if it is cancelled or fails before the turn
+        starts, e.g. when the agent is fired while waiting for a worker."""
+        owner = Lock()
+
+        def turn():
+            if owner.acquire(blocking=False):
+                agent.process(admission)
+
+        try:
+            await self.loop.run_in_executor(self.pool, turn)
+        except BaseException:
+            if admission is not None and owner.acquire(blocking=False):
+                from AaronsAgents import team_member
+                team_member.rate_limiter.release(admission)
+            raise
+
+    async def _agent_task(self, agent: any):
+        from AaronsAgents import team_member
+        log = self.log.getChild(f"Agent({agent.name})")
+        event = self._events[agent]
+        try:
+            while team_member.keep_running and agent.run:
+                started = monotonic()
+                event.clear()
+                if agent.budget_state() == EXHAUSTED:
+                    # paused until the budget is raised or reset; stimuli keep queueing meanwhile
+                    telemetry.inc("aagents_scheduler_transitions_total", agent=agent.name, transition="paused")
+                    await self._sleep_until(event, started + team_member.idle_spacing(agent), interruptible=True)
+                    continue
+                agent.stimulate(team_member.Stimulus("time", datetime.now().strftime("Current time: %Y-%m-%d %H:%M:%S %Z")))
+                try:
+                    await self._run_turn(agent, await self._admit(agent))
+                except Exception as e:
+                    log.exception(e)
+                # minimum sleep for API limits
+                await self._sleep_until(event, started + team_member.turn_spacing(agent), interruptible=False)
+                # sleep until stimulated or the idle timer fires
+                if len(agent.stimulus_queue) == 0:
+                    telemetry.inc("aagents_scheduler_transitions_total", agent=agent.name, transition="sleep")
+                    while team_member.keep_running and agent.run and len(agent.stimulus_queue) == 0:
+                        deadline = started + team_member.idle_spacing(agent)
+                        if monotonic() >= deadline:
+                            break
+                        event.clear()
+                        await self._sleep_until(event, deadline, interruptible=True)
+                    reason = "stimulus" if len(agent.stimulus_queue) > 0 else "timer"
+                    telemetry.inc("aagents_scheduler_transitions_total", agent=agent.name, transition=f"wake_{reason}")
+        finally:
+            self._tasks.pop(agent, None)
+            self._events.pop(agent, None)
+            agent.stop()
@@ -0,0 +1,411 @@
+"""Run one org across several worker processes, so agents are not all serialized on one GIL.
+
+Each shard is a process with its own AgentScheduler and its own chat models, built from the same config the
+headless runner uses. The parent process runs a broker thread that owns the org directory and routes messages
+between shards by member name over multiprocessing queues. Within a shard, members that live elsewhere are kept
+in the local TeamRegistry as ``RemoteMember`` stand-ins. Messaging, broadcast, contact lists, hiring and firing
+find them by name exactly as they find local members. Sends to a remote member wait for the owning shard to queue
+the stimulus, so a full queue is reported to the sender just as it is locally.
+
+New hires go to the shard with the fewest members. Rate limits from the config are divided evenly between the
+shards. Budgets, ad-hoc channels and telemetry are tracked per shard, and the org store is not supported.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future
+from datetime import datetime
+from threading import Thread, Lock
+
+module_logger = logging.getLogger(__name__)
+
+# broker <-> shard message kinds
+MEMBER = "member"
+GONE = "gone"
+STIMULATE = "stimulate"
+HIRE = "hire"
+FIRE = "fire"
+REPLY = "reply"
+DELIVERED = "delivered"
+AARON = "aaron"
+STOP = "stop"
+
+# delivery results
+QUEUED = "queued"
+QUEUE_FULL = "full"
+UNKNOWN = "unknown"
+
+hire_timeout = 60
+# longer than StimulusQueue's block_timeout, which the owning shard may wait out under the block policy
+delivery_timeout = 60
+
+
+def member_info(member: any, shard: int) -> dict:
+    return {"name": member.name, "shard": shard, "manager": member.manager.name if member.manager else None,
+            "rank": member.rank, "title": member.title, "presence": member.messaging_presence,
+            "status": member.messaging_status, "updated": member.messaging_updated}
+
+
+class RemoteMember:
+    """Stand-in for a team member on another shard."""
+
+    def __init__(self, router: "ShardRouter", info: dict, manager: any):
+        self.router = router
+        self.name = info["name"]
+        self.manager = manager
+        self.rank = info["rank"]
+        self.update(info)
+
+    def update(self, info: dict):
+        self.shard = info["shard"]
+        self.title = info["title"]
+        self.messaging_presence = info["presence"]
+        self.messaging_status = info["status"]
+        self.messaging_updated = info["updated"]
+
+    def manager_name(self) -> str:
+        return self.manager.name if self.manager is not None else "Aaron"
+
+    def stimulate(self, stim: any):
+        """Queue a stimulus on the owning shard. Raises StimulusQueueFull if the queue there rejects it."""
+        from AaronsAgents.stimulus_queue import StimulusQueueFull
+        result = self.router.deliver(self.name, stim)
+        if result == QUEUE_FULL:
+            raise StimulusQueueFull(f"stimulus queue of {self.name} on shard {self.shard} is full")
+        if result != QUEUED:
+            module_logger.warning(f"{stim.type} for {self.name} not confirmed: {result}")
+
+    def fire(self):
+        self.router.send(FIRE, self.name)
+
+    def budget_exhausted(self, scope: str):
+        from AaronsAgents.team_member import Stimulus
+        from AaronsAgents.stimulus_queue import StimulusQueueFull
+        try:
+            self.stimulate(Stimulus("system", f"Your {scope} budget is exhausted on shard {self.router.index}."))
+        except StimulusQueueFull:
+            module_logger.warning(f"could not notify {self.name} of exhausted budget")
+
+
+class ShardRouter:
+    """The shard side of the broker connection, installed as ``team_member.org_router``."""
+
+    def __init__(self, index: int, outbox: any, models: dict):
+        self.log = module_logger.getChild(f"{ShardRouter.__name__}({index})")
+        self.index = index
+        self.outbox = outbox
+        self.models = models
+        self._ids = itertools.count()
+        self._lock = Lock()
+        self._replies = {}
+
+    def send(self, *message):
+        self.outbox.put(message)
+
+    def model_key(self, model: any) -> str | None:
+        for key, candidate in self.models.items():
+            if candidate is model:
+                return key
+        return None
+
+    def announce(self, member: any):
+        """Tell the other shards about a local member, or about a change to its contact list entry."""
+        self.send(MEMBER, member_info(member, self.index))
+
+    def forget(self, member: any):
+        self.send(GONE, member.name)
+
+    def message_to_aaron(self, team_member_name: str, message: str):
+        self.send(AARON, team_member_name, message)
+
+    def hire(self, name: str, personality: str, title: str, job_description: str, rank: int, model: any,
+             manager: any, sub_model: any = None) -> str:
+        """Hire on whichever shard the broker picks. Blocks until the hire is done and returns the tool result."""
+        spec = {"name": name, "personality": personality, "title": title, "job_description": job_description,
+                "rank": rank, "model": self.model_key(model), "sub_model": self.model_key(sub_model),
+                "manager": manager.name if manager is not None else None}
+        return self.request(hire_timeout, f"error: timed out hiring {name}",
+                            lambda request: (HIRE, request, self.index, spec))
+
+    def deliver(self, name: str, stim: any) -> str:
+        """Queue a stimulus for a member on another shard. Blocks until the owning shard has tried and returns
+        QUEUED, QUEUE_FULL or UNKNOWN."""
+        return self.request(delivery_timeout, "timed out",
+                            lambda request: (STIMULATE, name, stim.type, stim.detail, stim.ts, request, self.index))
+
+    def request(self, timeout: float, timed_out: str, message: any) -> str:
+        """Send ``message(request id)`` and wait for the broker's reply to it."""
+        future = Future()
+        with self._lock:
+            request = next(self._ids)
+            self._replies[request] = future
+        self.send(*message(request))
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            return timed_out
+        finally:
+            with self._lock:
+                self._replies.pop(request, None)
+
+    def handle(self, message: tuple) -> bool:
+        """Apply one message from the broker. Returns False once told to stop."""
+        from AaronsAgents.team_member import TeamMember, Stimulus
+        from AaronsAgents.stimulus_queue import StimulusQueueFull
+        kind = message[0]
+        registry = TeamMember.team_members
+        if kind == MEMBER:
+            info = message[1]
+            existing = registry.get(info["name"])
+            if isinstance(existing, RemoteMember):
+                existing.update(info)
+                registry.touch()
+            elif existing is None:
+                manager = registry.get(info["manager"]) if info["manager"] is not None else None
+                registry.add(RemoteMember(self, info, manager))
+        elif kind == GONE:
+            existing = registry.get(message[1])
+            if isinstance(existing, RemoteMember):
+                registry.remove(existing)
+        elif kind == STIMULATE:
+            _, name, stim_type, detail, ts, request, origin = message
+            member = registry.get(name)
+            result = UNKNOWN
+            if isinstance(member, TeamMember):
+                try:
+                    member.stimulate(Stimulus(stim_type, detail, ts))
+                    result = QUEUED
+                except StimulusQueueFull:
+                    self.log.warning(f"rejected {stim_type} for {name}: queue full")
+                    result = QUEUE_FULL
+            if request is not None:
+                self.send(DELIVERED, request, origin, result)
+        elif kind == FIRE:
+            member = registry.get(message[1])
+            if isinstance(member, TeamMember):
+                member.fire()
+        elif kind == HIRE:
+            _, request, origin, spec = message
+            self.send(REPLY, request, origin, spec["name"], self.create(spec))
+        elif kind == REPLY:
+            with self._lock:
+                future = self._replies.get(message[1])
+            if future is not None:
+                future.set_result(message[2])
+        elif kind == STOP:
+            return False
+        return True
+
+    def create(self, spec: dict) -> str:
+        from AaronsAgents.team_member import TeamMember
+        manager = None
+        if spec["manager"] is not None:
+            manager = TeamMember.team_members.get(spec["manager"])
+            if manager is None:
+                return f"error: manager **{spec['manager']}** not found"
+        if spec["model"] not in self.models:
+            return f"error: model {spec['model']!r} is not configured"
+        try:
+            TeamMember(name=spec["name"], personality=spec["personality"], title=spec["title"],
+                       job_description=spec["job_description"], rank=spec["rank"], model=self.models[spec["model"]],
+                       manager=manager, sub_model=self.models.get(spec["sub_model"]))
+        except Exception as e:
+            return f"error: {e}"
+        return f"success: {spec['name']} hired, send them a message to get them started!"
+
+
+def shard_main(index: int, shards: int, config: dict, inbox: any, outbox: any, max_workers: int):
+    from AaronsAgents import aagents, team_member
+    from AaronsAgents.scheduler import AgentScheduler
+    from AaronsAgents.team_member import TeamMember
+    from AaronsAgents.wikipedia_cache import WikipediaCache
+    from AaronsAgents.knowledge_base import KnowledgeBase
+    log = module_logger.getChild(f"Shard({index})")
+    models = aagents.build_models(config)
+    router = ShardRouter(index, outbox, models)
+    team_member.verbose = False
+    aagents.apply_runtime(config)
+    team_member.org_router = router
+    team_member.aaron_message_callback = router.message_to_aaron
+    team_member.rate_limiter = aagents.build_rate_limiter(config, models, shards)
+    team_member.budget_ledger = aagents.build_budget_ledger(config)
+    if "wikipedia" in config:
+        # live lookups unless fixtures are given
+        team_member.wikipedia_cache = WikipediaCache(**{"fetch": team_member.api_wrapper.run, **config["wikipedia"]})
+    if "knowledge_base" in config:
+        # with a path, every shard indexes the same SQLite file and picks up the others' writes
+        team_member.knowledge_base = KnowledgeBase(**config["knowledge_base"])
+    scheduler = team_member.scheduler = AgentScheduler(max_workers)
+    scheduler.start()
+    try:
+        while True:
+            message = inbox.get()
+            try:
+                if not router.handle(message):
+                    break
+            except Exception as e:
+                log.exception(e)
+    finally:
+        team_member.keep_running = False
+        for member in list(TeamMember.team_members):
+            if isinstance(member, TeamMember):
+                member.stop()
+        scheduler.stop(10)
+
+
+class ShardedOrg:
+    """An org spread over ``shards`` worker processes, driven from this one.
+
+    Same surface as the headless runner's org: ``start()``, ``send()`` for Aaron's messages, ``stop()``.
+    Messages to Aaron are passed to ``aaron_message_callback(team_member_name, message)`` on the broker thread."""
+
+    def __init__(self, config: dict, shards: int = None, max_workers: int = 8, aaron_message_callback: any = None):
+        self.log = module_logger.getChild(ShardedOrg.__name__)
+        self.config = config
+        self.shards = shards or os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.aaron_message_callback = aaron_message_callback
+        context = multiprocessing.get_context("spawn")
+        self.outbox = context.Queue()
+        self.inboxes = [context.Queue() for _ in range(self.shards)]
+        self.processes = [context.Process(target=shard_main, name=f"Shard-{i}", daemon=True,
+                                          args=(i, self.shards, config, self.inboxes[i], self.outbox, max_workers))
+                          for i in range(self.shards)]
+        self._lock = Lock()
+        self._directory = {}
+        self._pending = {}
+        self._counts = [0] * self.shards
+        self._ids = itertools.count()
+        self._replies = {}
+        self.broker = Thread(target=self._broker, name="ShardBroker", daemon=True)
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        self.broker.start()
+        from AaronsAgents.team_member import director_personality, director_job_description
+        director = self.config.get("director", {})
+        result = self.hire("Director", director_personality, "Director", director_job_description, 1,
+                           director.get("model"), sub_model=director.get("sub_model"))
+        if not result.startswith("success"):
+            raise RuntimeError(f"could not hire the Director: {result}")
+
+    def hire(self, name: str, personality: str, title: str, job_description: str, rank: int, model: str,
+             manager: str = None, sub_model: str = None) -> str:
+        """Hire a member from outside the org; models are config keys and the manager is a name."""
+        future = Future()
+        with self._lock:
+            request = next(self._ids)
+            self._replies[request] = future
+        self.outbox.put((HIRE, request, None, {
+            "name": name, "personality": personality, "title": title, "job_description": job_description,
+            "rank": rank, "model": model, "sub_model": sub_model, "manager": manager}))
+        try:
+            return future.result(hire_timeout)
+        finally:
+            with self._lock:
+                self._replies.pop(request, None)
+
+    def send(self, message: str):
+        self.outbox.put((STIMULATE, "Director", "message", f"From: Aaron\nTo: Director\n{message}", datetime.now(),
+                         None, None))
+
+    def members(self) -> dict:
+        """The org directory: name -> contact info, including the shard the member lives on."""
+        with self._lock:
+            return dict(self._directory)
+
+    def shard_sizes(self) -> list[int]:
+        with self._lock:
+            return list(self._counts)
+
+    def stop(self, timeout: float = 15):
+        for inbox in self.inboxes:
+            inbox.put((STOP,))
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.outbox.put((STOP,))
+        self.broker.join(timeout)
+
+    def _owner(self, name: str) -> int | None:
+        info = self._directory.get(name)
+        return info["shard"] if info is not None else None
+
+    def _broadcast(self, message: tuple, skip: int = None):
+        for i, inbox in enumerate(self.inboxes):
+            if i != skip:
+                inbox.put(message)
+
+    def _broker(self):
+        while True:
+            message = self.outbox.get()
+            try:
+                if not self._route(message):
+                    return
+            except Exception as e:
+                self.log.exception(e)
+
+    def _route(self, message: tuple) -> bool:
+        kind = message[0]
+        if kind == MEMBER:
+            info = message[1]
+            with self._lock:
+                self._directory[info["name"]] = info
+            self._broadcast(message, skip=info["shard"])
+        elif kind == GONE:
+            with self._lock:
+                info = self._directory.pop(message[1], None)
+                if info is not None:
+                    self._counts[info["shard"]] -= 1
+            if info is not None:
+                self._broadcast(message, skip=info["shard"])
+        elif kind in (STIMULATE, FIRE):
+            with self._lock:
+                owner = self._owner(message[1])
+            if owner is None:
+                self.log.warning(f"{kind} for unknown member {message[1]}")
+                if kind == STIMULATE and message[5] is not None:
+                    self._reply(message[5], message[6], UNKNOWN)
+            else:
+                self.inboxes[owner].put(message)
+        elif kind == HIRE:
+            _, request, origin, spec = message
+            with self._lock:
+                taken = spec["name"] in self._directory or spec["name"] in self._pending
+                if not taken:
+                    shard = min(range(self.shards), key=lambda i: self._counts[i])
+                    self._counts[shard] += 1
+                    self._pending[spec["name"]] = shard
+            if taken:
+                self._reply(request, origin, f"error: team member name **{spec['name']}** not unique; pick a "
+                                             f"different name")
+            else:
+                self.inboxes[shard].put(message)
+        elif kind == REPLY:
+            _, request, origin, name, result = message
+            with self._lock:
+                shard = self._pending.pop(name, None)
+                if shard is not None and not result.startswith("success"):
+                    self._counts[shard] -= 1
+            self._reply(request, origin, result)
+        elif kind == DELIVERED:
+            _, request, origin, result = message
+            self._reply(request, origin, result)
+        elif kind == AARON:
+            if self.aaron_message_callback is not None:
+                self.aaron_message_callback(message[1], message[2])
+        elif kind == STOP:
+            return False
+        return True
+
+    def _reply(self, request: int, origin: int | None, result: str):
+        if origin is not None:
+            self.inboxes[origin].put((REPLY, request, result))
+            return
+        with self._lock:
+            future = self._replies.get(request)
+        if future is not None:
+            future.set_result(result)
@@ -0,0 +1,125 @@
+from collections import deque
+from threading import Lock, Condition
+from time import monotonic
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_ERROR = "error"
+
+# stimuli of these types may be merged or dropped; everything else is delivered or rejected
+low_priority_types = ("time",)
+
+
+class StimulusQueueFull(Exception):
+    pass
+
+
+class StimulusQueue:
+    """Bounded, thread-safe stimulus queue.
+
+    Queued ``time`` stimuli are merged so that only the latest is kept, and a stimulus identical to one already
+    waiting is dropped. When the queue is full a low-priority stimulus is discarded. Anything else is handled
+    by the overflow policy. ``block`` waits up to ``block_timeout`` seconds for room. ``error`` rejects at once.
+    ``drop_oldest`` evicts the oldest low-priority stimulus; since ``time`` stimuli are merged, that is at most
+    the one pending time stimulus, after which it rejects like ``error``. If no room can be made,
+    ``StimulusQueueFull`` is raised to the sender."""
+
+    def __init__(self, maxsize: int = 100, overflow: str = OVERFLOW_ERROR, block_timeout: float = 30):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_ERROR):
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._lock = Lock()
+        self._not_full = Condition(self._lock)
+        self._items = deque()
+        self._keys = {}
+        self.enqueued = 0
+        self.coalesced = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.high_water = 0
+
+    @staticmethod
+    def _key(stim: any) -> tuple:
+        return stim.type, stim.detail
+
+    def _append(self, stim: any):
+        self._items.append(stim)
+        key = self._key(stim)
+        self._keys[key] = self._keys.get(key, 0) + 1
+        self.enqueued += 1
+        self.high_water = max(self.high_water, len(self._items))
+
+    def _discard(self, stim: any):
+        self._items.remove(stim)
+        key = self._key(stim)
+        if self._keys[key] == 1:
+            del self._keys[key]
+        else:
+            self._keys[key] -= 1
+
+    def put(self, stim: any) -> bool:
+        """Queue a stimulus. Returns False if it was discarded as low priority. Raises StimulusQueueFull if the
+        overflow policy rejects it."""
+        low_priority = stim.type in low_priority_types
+        with self._lock:
+            if low_priority:
+                stale = [s for s in self._items if s.type == stim.type]
+                if stale:
+                    for s in stale:
+                        self._discard(s)
+                    self.coalesced += len(stale)
+            elif self._key(stim) in self._keys:
+                self.deduplicated += 1
+                return True
+            if len(self._items) >= self.maxsize:
+                if low_priority:
+                    self.dropped += 1
+                    return False
+                if not self._make_room():
+                    self.rejected += 1
+                    raise StimulusQueueFull(f"stimulus queue full ({self.maxsize} waiting)")
+            self._append(stim)
+            return True
+
+    def _make_room(self) -> bool:
+        if self.overflow == OVERFLOW_DROP_OLDEST:
+            for s in self._items:
+                if s.type in low_priority_types:
+                    self._discard(s)
+                    self.dropped += 1
+                    return True
+            return False
+        if self.overflow == OVERFLOW_BLOCK:
+            deadline = monotonic() + self.block_timeout
+            while len(self._items) >= self.maxsize:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+            return True
+        return False
+
+    def drain(self) -> list:
+        """Remove and return everything queued, oldest first."""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            self._keys.clear()
+            self._not_full.notify_all()
+            return items
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"depth": len(self._items), "enqueued": self.enqueued, "coalesced": self.coalesced,
+                    "deduplicated": self.deduplicated, "dropped": self.dropped, "rejected": self.rejected,
+                    "high_water": self.high_water}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._items))
@@ -0,0 +1,176 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import message_chunk_to_message
+
+from AaronsAgents.llm_cache import unwrap
+
+module_logger = logging.getLogger(__name__)
+
+# runs the tool calls of every streaming turn; tools mostly wait on other agents' locks or the network
+tool_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ToolCall")
+
+# same limit and final answer as AgentExecutor
+max_iterations = 15
+stopped_output = "Agent stopped due to iteration limit or time limit."
+
+# tools that only read, so they may run alongside each other and alongside sends
+read_only_tools = {"wikipedia", "kb_search", "kb_get"}
+# tools that only deliver to one recipient, by the argument naming it; sends to different recipients may overlap
+send_tools = {"messaging_send": "team_member_name"}
+
+
+def streams_tool_calls(model: any) -> bool:
+    """langchain_anthropic 0.1.x makes a blocking call whenever tools are bound and then emits one chunk, losing
+    the provider's usage report on the way; for such models the turn invokes instead and only parallelizes."""
+    return not isinstance(unwrap(model), ChatAnthropic)
+
+
+def tool_message(call: dict, observation: any) -> ToolMessage:
+    """The observation as format_to_tool_messages would feed it back."""
+    if not isinstance(observation, str):
+        try:
+            observation = json.dumps(observation, ensure_ascii=False)
+        except Exception:
+            observation = str(observation)
+    return ToolMessage(content=observation, tool_call_id=call["id"], additional_kwargs={"name": call["name"]})
+
+
+def after(deps: list[Future], fn: any, *args) -> Future:
+    """Submit ``fn(*args)`` to ``tool_executor`` once every future in ``deps`` is done, without holding a
+    worker while waiting."""
+    deps = [dep for dep in deps if dep is not None]
+    ret = Future()
+    pending = [len(deps) + 1]
+    lock = Lock()
+
+    def ready(_=None):
+        with lock:
+            pending[0] -= 1
+            if pending[0]:
+                return
+        inner = tool_executor.submit(fn, *args)
+        inner.add_done_callback(lambda f: ret.set_result(f.result()))
+    for dep in deps:
+        dep.add_done_callback(ready)
+    ready()
+    return ret
+
+
+class CallOrder:
+    """Orders the tool calls of one response. Calls that change the member's or the org's state (hire, fire,
+    notepad, status, timer, channels, knowledge base writes, broadcasts) run one at a time in call order, after
+    everything before them and before everything after them. Between two such calls, reads run concurrently,
+    and so do sends, except that sends to the same recipient keep their order."""
+
+    def __init__(self):
+        self.barrier = None
+        self.since_barrier = []
+        self.last_send = {}
+
+    def deps(self, call: dict) -> list[Future]:
+        if call["name"] in read_only_tools:
+            return [self.barrier]
+        if call["name"] in send_tools:
+            recipient = call["args"].get(send_tools[call["name"]])
+            return [self.barrier, self.last_send.get(recipient)]
+        return [self.barrier] + self.since_barrier
+
+    def started(self, call: dict, future: Future):
+        if call["name"] in read_only_tools:
+            self.since_barrier.append(future)
+        elif call["name"] in send_tools:
+            self.since_barrier.append(future)
+            self.last_send[call["args"].get(send_tools[call["name"]])] = future
+        else:
+            self.barrier = future
+            self.since_barrier = []
+            self.last_send = {}
+
+
+class StreamingTurn:
+    """One agent turn as a manual tool-calling loop instead of an AgentExecutor.
+
+    The model's response is streamed, and each tool call is started on ``tool_executor`` as soon as the next
+    call begins or the response ends, i.e. as soon as its arguments are complete, and as soon as the calls it
+    depends on (see CallOrder) are done. Independent reads and sends run concurrently, so a recipient can
+    receive a message while the sender's response is still arriving. Observations are fed back in call order, as AgentExecutor does, until the model answers without tools."""
+
+    def __init__(self, member: any, callbacks: list):
+        self.log = module_logger.getChild(f"{StreamingTurn.__name__}({member.name})")
+        self.member = member
+        self.callbacks = callbacks
+        self.tools = {tool.name: tool for tool in member.tools}
+        self.model = member.tool_model
+        self.stream = streams_tool_calls(member.model)
+
+    def run(self, system: SystemMessage, input: str) -> AIMessage:
+        """Run the turn and record it in the member's history like RunnableWithMessageHistory would."""
+        history = self.member.chat_history.messages
+        scratchpad = []
+        final = None
+        for _ in range(max_iterations):
+            response, calls = self.respond(system, history + [HumanMessage(content=input)] + scratchpad)
+            if not calls:
+                final = AIMessage(content=response.content)
+                break
+            scratchpad.append(response)
+            scratchpad.extend(tool_message(call, future.result()) for call, future in calls)
+        if final is None:
+            final = AIMessage(content=stopped_output)
+        self.member.chat_history.add_messages([HumanMessage(content=input), final])
+        return final
+
+    def respond(self, system: SystemMessage, messages: list[BaseMessage]) -> tuple[AIMessage, list]:
+        """Get one model response, starting its tool calls along the way. Returns the response and
+        (tool call, future) pairs in call order."""
+        llm, messages = self.model, [system] + messages
+        if not isinstance(system.content, str):
+            # cacheable system blocks go in the Anthropic system parameter, see with_system_blocks
+            llm, messages = llm.bind(system=system.content), messages[1:]
+        config = {"callbacks": self.callbacks}
+        calls = []
+        order = CallOrder()
+        if not self.stream:
+            response = llm.invoke(messages, config)
+            calls.extend((call, self.dispatch(call, order)) for call in response.tool_calls)
+            return response, calls
+
+        response = None
+        for chunk in llm.stream(messages, config):
+            if not isinstance(chunk, AIMessageChunk):
+                # models without native streaming yield their whole response
+                response = chunk
+                break
+            response = chunk if response is None else response + chunk
+            # a call's arguments are complete once the next call starts
+            while len(response.tool_call_chunks) > len(calls) + 1:
+                call = response.tool_calls[len(calls)]
+                calls.append((call, self.dispatch(call, order)))
+        if response is None:
+            return AIMessage(content=""), []
+        for call in response.tool_calls[len(calls):]:
+            calls.append((call, self.dispatch(call, order)))
+        return message_chunk_to_message(response), calls
+
+    def dispatch(self, call: dict, order: CallOrder) -> Future:
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            future = Future()
+            future.set_result(f"{call['name']} is not a valid tool, try one of [{', '.join(self.tools)}].")
+            return future
+        self.log.info(f"dispatching {call['name']} {json.dumps(call['args'])}")
+        future = after(order.deps(call), self.call_tool, tool, call["args"])
+        order.started(call, future)
+        return future
+
+    def call_tool(self, tool: any, args: dict) -> str:
+        try:
+            return tool.invoke(args, {"callbacks": self.callbacks})
+        except Exception as e:
+            self.log.exception(e)
+            return f"error: {e}"
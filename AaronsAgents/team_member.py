@@ -1,9 +1,8 @@
 import logging
+from functools import lru_cache
 from threading import Thread
 from typing import Sequence
 
-from langchain.memory import ConversationBufferWindowMemory
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompt_values import PromptValue
 from langchain_core.runnables import RunnableSerializable
@@ -14,14 +13,31 @@ from langchain_anthropic import ChatAnthropic
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_anthropic.output_parsers import ToolsOutputParser
-from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from langchain_core.messages import AIMessage, HumanMessage, BaseMessage, SystemMessage
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.tools import tool, BaseTool
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+from langchain.agents.output_parsers.tools import ToolsAgentOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.tools import WikipediaQueryRun
 from langchain_community.utilities import WikipediaAPIWrapper
 
+from AaronsAgents.memory import AgentMemory
+from AaronsAgents.persistence import MEMBER, QUEUE, HISTORY
+from AaronsAgents.registry import TeamRegistry
+from AaronsAgents.event_bus import MEMBER as MEMBER_STATE
+from AaronsAgents.channels import ChannelRegistry, ChannelError, AARON
+from AaronsAgents.wikipedia_cache import WikipediaCache
+from AaronsAgents.knowledge_base import KnowledgeBaseError
+from AaronsAgents.llm_cache import unwrap
+from AaronsAgents.stimulus_queue import StimulusQueue, StimulusQueueFull
+from AaronsAgents.streaming import StreamingTurn
+from AaronsAgents.telemetry import telemetry, TelemetryCallback
+from AaronsAgents.budget import BudgetCallback, BudgetExhausted, OK, NEAR, EXHAUSTED
+from AaronsAgents.rate_limiter import (RateLimitCallback, Ticket, estimate_tokens, PRIORITY_AARON, PRIORITY_DIRECTOR,
+                                       PRIORITY_MESSAGE, PRIORITY_TIME)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s.%(msecs)03d %(levelname)-6s %(threadName)-15s %(name)-15s %(message)s',
@@ -31,6 +47,16 @@ logging.basicConfig(
 module_logger = logging.getLogger(__name__)
 notepad_limit = 2000
 mandatory_sleep = 10
+stimulus_queue_limit = 100
+# one of "block", "drop_oldest", "error"; see StimulusQueue
+stimulus_overflow_policy = "error"
+# AgentExecutor prints each step to stdout when set
+verbose = True
+# estimated tokens of conversation history kept per agent before older turns are summarized
+history_token_budget = 8000
+# run turns with StreamingTurn, starting each tool call as soon as its arguments are complete, instead of
+# an AgentExecutor that runs them one at a time after the whole response
+streaming_turns = False
 
 class Stimulus:
     def __init__(self, type: str, detail:str, ts: datetime = None):
@@ -42,42 +68,226 @@ class Stimulus:
 keep_running = True
 
 api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=3000)
-tool_wikipedia_search = WikipediaQueryRun(api_wrapper=api_wrapper)
+# shared by every agent; replace with WikipediaCache(fixtures=...) to run offline
+wikipedia_cache = WikipediaCache(api_wrapper.run)
+
+
+class WikipediaInput(BaseModel):
+    query: str = Field(..., description="query to look up")
+
+
+@tool("wikipedia", args_schema=WikipediaInput)
+def tool_wikipedia_search(query: str) -> str:
+    """A wrapper around Wikipedia. Useful for when you need to answer general questions about people, places,
+    companies, facts, historical events, or other subjects. Input should be a search query."""
+    try:
+        return wikipedia_cache.lookup(query)
+    except Exception as e:
+        return f"error: wikipedia lookup failed: {e}"
 
 aaron_message_callback = None
 
+# set to an AgentScheduler to run new team members as scheduled tasks instead of one thread each
+scheduler = None
+
+# set to a RateLimiter to gate model calls centrally; this replaces the per-agent mandatory_sleep
+rate_limiter = None
+
+# set to an OrgStore to persist the org as it changes
+org_store = None
+
+# set to a ShardRouter when this process is one shard of a multi-process org
+org_router = None
+
+# set to an EventBus to publish each member's presence, queue depth and activity for a UI
+event_bus = None
+
+# set to a KnowledgeBase to give agents the kb_ tools
+knowledge_base = None
+
+# set to a BudgetLedger to cap token and cost spend per agent and per subtree
+budget_ledger = None
+# agents near a budget limit take turns at most this often, and their idle timer is stretched by this factor
+budget_turn_spacing = 30
+budget_slowdown = 4
+
+
+def turn_spacing(agent: any = None) -> float:
+    """Minimum seconds between the starts of an agent's turns."""
+    spacing = mandatory_sleep if rate_limiter is None else 0
+    if agent is not None and agent.budget_state() == NEAR:
+        spacing = max(spacing, budget_turn_spacing)
+    return spacing
+
+
+def idle_spacing(agent: any) -> float:
+    """Seconds an idle agent sleeps before its next time stimulus."""
+    if agent.budget_state() == NEAR:
+        return agent.idle_sleep_seconds * budget_slowdown
+    return agent.idle_sleep_seconds
+
+
 def agent_thread(agent: any):
     log = module_logger.getChild(f"{TeamMember.__name__}({agent.name})-Thread")
     while keep_running and agent.run:
         now = datetime.now()
+        if agent.budget_state() == EXHAUSTED:
+            # paused until the budget is raised or reset; stimuli keep queueing meanwhile
+            telemetry.inc("aagents_scheduler_transitions_total", agent=agent.name, transition="paused")
+            while keep_running and agent.run and now + timedelta(seconds=idle_spacing(agent)) > datetime.now():
+                sleep(1)
+            continue
         agent.stimulate(Stimulus("time", now.strftime("Current time: %Y-%m-%d %H:%M:%S %Z")))
         try:
             agent.process()
         except Exception as e:
             log.exception(e)
         # minimum sleep for API limits
-        while (now + timedelta(seconds=mandatory_sleep) > datetime.now() or
-               len(agent.stimulus_queue) == 0 and now + timedelta(seconds=agent.idle_sleep_seconds) > datetime.now()):
+        while now + timedelta(seconds=turn_spacing(agent)) > datetime.now():
             sleep(1)
-    TeamMember.team_members.remove(agent)
-
-
-store = {}
-
-
-def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+        if len(agent.stimulus_queue) == 0:
+            telemetry.inc("aagents_scheduler_transitions_total", agent=agent.name, transition="sleep")
+            while (keep_running and agent.run and len(agent.stimulus_queue) == 0 and
+                   now + timedelta(seconds=idle_spacing(agent)) > datetime.now()):
+                sleep(1)
+            reason = "stimulus" if len(agent.stimulus_queue) > 0 else "timer"
+            telemetry.inc("aagents_scheduler_transitions_total", agent=agent.name, transition=f"wake_{reason}")
+    agent.stop()
+
+
+agent_prompt = ChatPromptTemplate.from_messages([
+    ("placeholder", "{system}"),
+    ("placeholder", "{history}"),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}"),
+])
+
+
+@lru_cache
+def employee_handbook(notepad_limit: int) -> str:
+    """The static part of the system prompt, shared by every team member and cacheable by the provider."""
+    return (f"# Aaron's Agents Employee Instructions \n"
+            f"Welcome, team member, to your private office at Aaron's Agents.\n"
+            f"## Employee Handbook\n"
+            f"### Organization Structure\n"
+            f"Team members at Aaron's Agents work in a hierarchical structure. Each team member has a rank that "
+            f"denotes the number of managers above them. At rank 0 is Aaron, a human. Aaron communicates directly "
+            f"with the Director team member at rank 1. Other team members should not message Aaron directly. Aaron "
+            f"has established this hierarchy to minimize distractions for himself and for other team members while "
+            f"we all work towards goals at Aaron's direction. Unless you are rank 1, you report "
+            f"to a manager. You can communicate with your manager directly as well as any team members who have "
+            f"the same manager. Additionally, if you think of a way to improve your productivity with a subordinate "
+            f"team member, you can make a request with your manager. If your manager agrees, they can ask their "
+            f"manager, and so on, up to the Director. The Director will get approval from Aaron. You may not get "
+            f"approval for the same number of subordinates as you request. Once approved, you may use the "
+            f"**hire_team_member** tool to hire your new team member(s).\n"
+            f"### Work assignments\n"
+            f"Your manager will message you with work assignments. If you have completed all of your assignments, "
+            f"Review information in the knowledge base and add information from your recent work to it while you "
+            f"wait for your next assignment. Be sure to set your messaging status to **Available** to let your "
+            f"manager and teammates know that you have completed your work.\n"
+            f"### Tools\n"
+            f"You have a number of tools at your disposal. Use these to accomplish your work assignments and "
+            f"interact with your manager, teammates, and subordinates. The list of available tools is provided "
+            f"below. Beside what you already know, these tools are the only means you have to obtain more info and"
+            f"communicate it. Be creative about how you use and combine them. But also bear in mind that tool use "
+            f"costs money, and it would be better to think a bit more and make a single call to a tool as opposed "
+            f"to making several incremental calls (in cases where this would apply, anyway, like the notepad).\n"
+            f"### Communications\n"
+            f"As you are in your private office, no one can hear you talk. Anything you say out loud will only be"
+            f"heard by you. To communicate with anyone, you must use the messaging tools. These tools are have "
+            f"names beginning with **messaging_**. The contact list is provided below and shows the name, presence "
+            f"indication, and status message of each team member. Be sure to keep your presence and status "
+            f"updated so your coworkers know what you are up to and if it's a good time to chat. To send the same "
+            f"message to a group, use **messaging_broadcast** with one of your channels instead of several "
+            f"**messaging_send** calls. Every manager has a team channel with their direct reports, and you can "
+            f"create other channels with **channel_create**.\n"
+            f"### Knowledge Base\n"
+            f"We use the knowledge base to share information with each other and to remember how we tackled "
+            f"problems in the past. You can interact with the knowledge base using tools that start with **kb_**. "
+            f"You should frequently make additions to the knowledge base and check for relevant information in the "
+            f"knowledge base while you are working.\n"
+            f"### How To Work\n"
+            f"As a large language model, your experience is episodic. On each round trip, your existence is "
+            f"essentially rehydrated from as much data as is practical to include in the context. Depending on "
+            f"which model is being used to power you, this can be between around 8k tokens and as much as 200k "
+            f"tokens. But after a while, the available context will be full and past experiences will need to be "
+            f"pruned. For this reason, you'll need to be vigilant about using the tools at your disposal to ensure "
+            f"that you have what you need to respond to future stimuli.\n"
+            f"You can be stimulated by a number of sources: \n"
+            f" - message from another team member\n"
+            f" - message from yourself (you can use this to send yourself a temporary reminder)\n"
+            f" - periodic time update (essentially an alarm clock)\n"
+            f" - system notifications\n"
+            f"If you do not have any queued stimuli, you will go to sleep after you finish this request. So it's "
+            f"important to send yourself messages if you need to stay awake to work on something. Additionally, "
+            f"messages to yourself can be used to leave yourself ephemeral notes. Remember that messages are part "
+            f"of your experience history, so they will eventually be pruned to make room in your context for new "
+            f"experiences. So anything that you  need to remember should be written on your notepad or saved in "
+            f"the knowledge base.\n"
+            f"It's also important to note that your cost burden to Aaron is directly related to the number of "
+            f"turns you take, so we want to balance busywork with sleep. You are free to take multiple turns to "
+            f"review documentation or work on the knowledge base, but if it goes for more than a few turns, it "
+            f"would probably be best to take a break and go to sleep until you are stimulated. By no means should "
+            f"you consider going to sleep a bad thing. If you are waiting on another team member, a manager, Aaron,"
+            f"or for some time to pass, you should consider going to sleep a good option. You have a timer to wake "
+            f"yourself up at a particular time, and you will be awakened by any stimulus you receive while you "
+            f"sleep.\n"
+            f"Speaking of the notepad, the notepad is a free-form text block that only you see. You can write "
+            f"whatever you want on it, but every time you write something, the entire notepad is cleared and filled "
+            f"in with just what you write--so if you have stuff in your notepad and you want to add to it, you'll "
+            f"need to copy the existing stuff _plus_ the new stuff into the notepad. The notepad content is "
+            f"automatically included in the context of every call. You can interact with your notepad using the"
+            f"tools beginning with **notepad_**. It's a good idea to write out at least your task assignments and "
+            f"plan of action on your notepad. Use markdown to keep it clean, and this also allows you to make "
+            f"checklists and check things off as you finish them. It's also a good place to keep notes on feedback "
+            f"you've received or changes your manager has made to your job description over time. Note that the "
+            f"notepad has a {notepad_limit} character limit.\n"
+            f"And it must again be reiterated--please do not make duplicate tool calls, like setting your status "
+            f"to the same thing over and over again. It's a waste of money. Just go to sleep for a while if you "
+            f"have nothing else to do.\n"
+            f"Since you are in a private office, nothing you say is heard by anyone. Stuff you say to yourself is "
+            f"kept as part of your experience history as long as it allows. Use that space to say what the next "
+            f"thing you will do is.\n"
+            f"### Stimulus? Human?\n"
+            f"Aaron (the human) designed the stimulus system to allow LLM instances such as yourself to have an "
+            f"existence that stretches beyond the bounds of a context window and to be able to participate in as "
+            f"part of a team rather than being limited to a single conversation with a human. As a result, you "
+            f"will see stimulus come in as though it is from a human/user. This stuff is generated by the "
+            f"framework. Remember that the only way to communicate with other team members is using the messaging "
+            f"tools. When you complete an assignment, you will need to send the results to your manager using the "
+            f"messaging tools.\n"
+            f"### Feedback\n"
+            f"Team members are encouraged to give constructive feedback to each other. Managers should check in "
+            f"with their subordinates regularly to check that they have what they need and are not stuck. This "
+            f"should include process feedback that we can use to improve the way we work here. Additionally, "
+            f"team members should let their managers know if they think of new tools that would help!"
+            f"---\n"
+            f"Thanks for being part of the Aaron's Agents team!\n"
+            f"**Please, please, don't forget that you must use the messaging tools to communicate with other team"
+            f"members, managers, subordinates, or Aaron! You must use the messaging tools!\n"
+            f"The messaging tools!\n"
+            f"\n\n\n")
+
+
+def with_system_blocks(llm_with_tools: RunnableSerializable) -> RunnableLambda:
+    """langchain_anthropic only accepts a string system message, so a system message made of content blocks
+    (carrying cache_control markers) is passed through the ``system`` request parameter instead."""
+    def invoke(prompt_value: PromptValue, config) -> BaseMessage:
+        messages = prompt_value.to_messages()
+        if messages and isinstance(messages[0], SystemMessage) and not isinstance(messages[0].content, str):
+            return llm_with_tools.bind(system=messages[0].content).invoke(messages[1:], config)
+        return llm_with_tools.invoke(messages, config)
+    return RunnableLambda(invoke)
 
 
 class TeamMember:
     threads = []
-    team_members = []
+    team_members = TeamRegistry()
+    channels = ChannelRegistry(team_members)
 
     def __init__(self, name: str, personality: str, title: str, job_description: str, rank: int, model: any, manager: any, sub_model: any = None, before_start_callback: any = None):
-        matches = list(filter(lambda x: x.name == name, TeamMember.team_members))
-        if len(matches) > 0:
+        if TeamMember.team_members.get(name) is not None:
             raise Exception(f"Team member **{name}** already exists")
         self.log = module_logger.getChild(f"{TeamMember.__name__}({name}) ")
         self.name = name
@@ -88,21 +298,39 @@ class TeamMember:
         self.sub_model = sub_model if sub_model is not None else model
         self.manager = manager
         self.rank = rank
-        self.stimulus_queue: [Stimulus] = [Stimulus(type="welcome", detail="Here's your office. Settle in and hang out until your manager gets in touch with you.")]
+        self.stimulus_queue = StimulusQueue(stimulus_queue_limit, stimulus_overflow_policy)
+        self.stimulus_queue.put(Stimulus(type="welcome", detail="Here's your office. Settle in and hang out until your manager gets in touch with you."))
         self.notepad: str = ""
-        self.chat_history = ConversationBufferWindowMemory(k=20, memory_key="history")
-        self.thread = Thread(target=agent_thread, args=(self,))
+        self.chat_history = AgentMemory(history_token_budget, self.summarize_history, name)
+        self.tools = None
+        self.agent_model = None
+        self.tool_model = None
+        self.agent_with_chat_history = None
+        self.scheduler = scheduler
+        self.thread = Thread(target=agent_thread, args=(self,)) if self.scheduler is None else None
         self.run = True
         self.idle_sleep_seconds = 60
         self.messaging_presence = "Available"
         self.messaging_status = ""
         self.messaging_updated = datetime.now() - timedelta(hours=1)
+        self.busy = False
+        self.identity_key = None
+        self.identity_text = ""
+        self.contacts_version = -1
+        self.contacts_text = ""
         self.stimulate(Stimulus("welcome", "Welcome again to the team! Your manager will message you with your first assignment shortly!"))
         if before_start_callback is not None:
             before_start_callback(self)
-        TeamMember.threads.append(self.thread)
-        self.thread.start()
-        TeamMember.team_members.append(self)
+        TeamMember.team_members.add(self)
+        if org_router is not None:
+            org_router.announce(self)
+        self.persist(MEMBER, QUEUE, HISTORY)
+        self.publish_state()
+        if self.scheduler is not None:
+            self.scheduler.add(self)
+        else:
+            TeamMember.threads.append(self.thread)
+            self.thread.start()
 
     def get_tools(self) -> Sequence[BaseTool]:
         class MessageInput(BaseModel):
@@ -119,16 +347,76 @@ class TeamMember:
                 else:
                     aaron_message_callback(self.name, message)
                     return "success: message sent"
-            matches = list(filter(lambda x: x.name == team_member_name, TeamMember.team_members))
-            if len(matches) == 0:
+            recipient = TeamMember.team_members.get(team_member_name)
+            if recipient is None:
                 return f"error: team member **{team_member_name}** not found"
 
-            matches[0].stimulate(Stimulus("message",
-                                          f"From: {self.name}\n"
-                                          f"To: {team_member_name}\n"
-                                          f"{message}", datetime.now()))
+            try:
+                recipient.stimulate(Stimulus("message",
+                                             f"From: {self.name}\n"
+                                             f"To: {team_member_name}\n"
+                                             f"{message}", datetime.now()))
+            except StimulusQueueFull:
+                return f"error: {team_member_name} has too many unread messages; try again later"
             return "success: message sent"
 
+        class ChannelCreateInput(BaseModel):
+            channel_name: str = Field(..., description="name of the new channel")
+            members: list[str] = Field(..., description="names of the team members to include (you are included "
+                                                        "automatically)")
+
+        @tool("channel_create", args_schema=ChannelCreateInput)
+        def tool_channel_create(channel_name: str, members: list[str]) -> str:
+            """Create a group channel so you can message several team members at once with messaging_broadcast.
+            Managers already have a team channel, team:<manager name>, with them and all of their direct
+            reports."""
+            self.log.info(f"tool_channel_create: {channel_name} {members}")
+            if AARON in members and self.rank > 1:
+                return "error: insufficient rank to add Aaron to a channel"
+            try:
+                resolved = TeamMember.channels.create(channel_name, self, members)
+            except ChannelError as e:
+                return f"error: {e}"
+            return f"success: channel {channel_name} created with {', '.join(resolved)}"
+
+        class BroadcastInput(BaseModel):
+            channel_name: str = Field(..., description="name of the channel to send to, e.g. team:<manager name>")
+            message: str = Field(..., description="message to be sent to every other member of the channel")
+
+        @tool("messaging_broadcast", args_schema=BroadcastInput)
+        def tool_messaging_broadcast(channel_name: str, message: str) -> str:
+            """Send one message to every member of a channel you belong to. Use this instead of several
+            messaging_send calls when the same message goes to a group."""
+            self.log.info(f"tool_messaging_broadcast: {channel_name} {message}")
+            members = TeamMember.channels.members(channel_name)
+            if members is None:
+                return f"error: channel **{channel_name}** not found"
+            if self.name not in members:
+                return f"error: you are not a member of {channel_name}"
+            recipients = [name for name in members if name != self.name]
+            if AARON in recipients and self.rank > 1:
+                return "error: insufficient rank to send message to Aaron"
+            # one stimulus, queued for every recipient
+            stim = Stimulus("message", f"From: {self.name}\nTo: {channel_name} ({', '.join(members)})\n{message}",
+                            datetime.now())
+            failed = []
+            for name in recipients:
+                if name == AARON:
+                    aaron_message_callback(self.name, f"[{channel_name}] {message}")
+                    continue
+                recipient = TeamMember.team_members.get(name)
+                if recipient is None:
+                    failed.append(name)
+                    continue
+                try:
+                    recipient.stimulate(stim)
+                except StimulusQueueFull:
+                    failed.append(name)
+            if failed:
+                return (f"partial: message sent to {len(recipients) - len(failed)} of {len(recipients)}; not "
+                        f"delivered to {', '.join(failed)}")
+            return f"success: message sent to {len(recipients)} team members"
+
         class NotepadInput(BaseModel):
             new_text: str = Field(..., description="new notepad text")
 
@@ -140,6 +428,7 @@ class TeamMember:
             if len(new_text) > notepad_limit:
                 return "error: too long, cannot set notebook content"
             self.notepad = new_text
+            self.persist(MEMBER)
             return "success: notepad updated."
 
         class TimerUpdateInput(BaseModel):
@@ -154,6 +443,7 @@ class TeamMember:
                 self.idle_sleep_seconds = 60
             else:
                 self.idle_sleep_seconds = delay_seconds
+            self.persist(MEMBER)
             return f"interval set: {self.idle_sleep_seconds} seconds"
 
         class MessagingStatusInput(BaseModel):
@@ -169,6 +459,11 @@ class TeamMember:
             self.messaging_status = status
             self.messaging_presence = presence
             self.messaging_updated = datetime.now()
+            TeamMember.team_members.touch()
+            self.persist(MEMBER)
+            self.publish_state()
+            if org_router is not None:
+                org_router.announce(self)
             return f"status updated: {self.messaging_presence} - {self.messaging_status}"
 
         class HireTeamMemberInput(BaseModel):
@@ -191,12 +486,18 @@ class TeamMember:
             self.log.info(f"hire_team_member: {name} {title} {job_description}")
             if name == "Aaron":
                 return "error: team member cannot be named Aaron"
-            matches = list(filter(lambda x: x.name == name, TeamMember.team_members))
-            if len(matches) > 0:
+            if TeamMember.team_members.get(name) is not None:
                 return f"error: team member name **{name}** not unique; pick a different name"
-            new_team_member: TeamMember = TeamMember(name=name, title=title, job_description=job_description,
-                                                     personality=personality,
-                                                     model=self.sub_model, manager=self, rank=self.rank+1)
+            if org_router is not None:
+                return org_router.hire(name=name, personality=personality, title=title,
+                                       job_description=job_description, rank=self.rank+1, model=self.sub_model,
+                                       manager=self)
+            try:
+                new_team_member: TeamMember = TeamMember(name=name, title=title, job_description=job_description,
+                                                         personality=personality,
+                                                         model=self.sub_model, manager=self, rank=self.rank+1)
+            except Exception as e:
+                return f"error: {e}"
             return f"success: {name} hired, send them a message to get them started!"
 
         class FireTeamMemberInput(BaseModel):
@@ -208,187 +509,381 @@ class TeamMember:
             self.log.info(f"fire_team_member: {name}")
             if name == "Aaron":
                 return "error: cannot fire Aaron"
-            matches = list(filter(lambda x: x.name == name, TeamMember.team_members))
-            if len(matches) == 0:
+            member = TeamMember.team_members.get(name)
+            if member is None:
                 return f"error: team member name **{name}** not found"
-            if matches[0].manager != self:
-                return f"error: team member works for {matches[0].manager.name if matches[0].manager is not None else 'another manager'}, not you"
+            if member.manager != self:
+                return f"error: team member works for {member.manager.name if member.manager is not None else 'another manager'}, not you"
 
-            matches[0].agent_run = False
-            TeamMember.team_members.remove(matches[0])
+            member.fire()
             return f"success: {name} fired"
 
-        return [tool_messaging_send,
-                tool_notepad_edit,
-                tool_messaging_status_set,
-                tool_timer_set,
-                tool_hire_team_member,
-                tool_fire_team_member,
-                tool_wikipedia_search]
+        tools = [tool_messaging_send,
+                 tool_messaging_broadcast,
+                 tool_channel_create,
+                 tool_notepad_edit,
+                 tool_messaging_status_set,
+                 tool_timer_set,
+                 tool_hire_team_member,
+                 tool_fire_team_member,
+                 tool_wikipedia_search]
+        if knowledge_base is not None:
+            tools += self.get_kb_tools()
+        return tools
+
+    def get_kb_tools(self) -> Sequence[BaseTool]:
+        class KbAddInput(BaseModel):
+            title: str = Field(..., description="short, descriptive title")
+            content: str = Field(..., description="the information to share, written so a teammate without your "
+                                                  "context can use it")
+            tags: list[str] = Field(default=None, description="optional keywords, e.g. project or topic names")
+
+        @tool("kb_add", args_schema=KbAddInput)
+        def tool_kb_add(title: str, content: str, tags: list[str] = None) -> str:
+            """Add an entry to the shared knowledge base. Search first and update an existing entry instead of
+            adding a near duplicate."""
+            self.log.info(f"tool_kb_add: {title}")
+            try:
+                entry = knowledge_base.add(title, content, self.name, tags)
+            except KnowledgeBaseError as e:
+                return f"error: {e}"
+            return f"success: added entry {entry.id}"
+
+        class KbUpdateInput(BaseModel):
+            entry_id: int = Field(..., description="id of the entry to update")
+            content: str = Field(..., description="new content, replacing the old content entirely")
+            title: str = Field(default=None, description="new title (optional)")
+
+        @tool("kb_update", args_schema=KbUpdateInput)
+        def tool_kb_update(entry_id: int, content: str, title: str = None) -> str:
+            """Replace the content (and optionally the title) of a knowledge base entry. Use kb_get first so that
+            you keep what is still correct."""
+            self.log.info(f"tool_kb_update: {entry_id}")
+            try:
+                entry = knowledge_base.update(entry_id, self.name, content=content, title=title)
+            except KnowledgeBaseError as e:
+                return f"error: {e}"
+            return f"success: updated entry {entry.id}"
+
+        class KbSearchInput(BaseModel):
+            query: str = Field(..., description="keywords to search for")
+            limit: int = Field(default=5, description="maximum number of results (at most 20)")
+
+        @tool("kb_search", args_schema=KbSearchInput)
+        def tool_kb_search(query: str, limit: int = 5) -> str:
+            """Search the shared knowledge base. Returns the best matching entries with a snippet of each; use
+            kb_get to read a whole entry."""
+            self.log.info(f"tool_kb_search: {query}")
+            results = knowledge_base.search(query, max(1, min(limit, 20)))
+            if not results:
+                return "no matching entries"
+            return "\n\n".join(f"[{entry.id}] {entry.title}" + (f" ({', '.join(entry.tags)})" if entry.tags else "")
+                               + f" - {entry.author}, {entry.updated.strftime('%Y-%m-%d %H:%M')}\n{snippet}"
+                               for entry, _, snippet in results)
+
+        class KbGetInput(BaseModel):
+            entry_id: int = Field(..., description="id of the entry to read")
+
+        @tool("kb_get", args_schema=KbGetInput)
+        def tool_kb_get(entry_id: int) -> str:
+            """Read a whole knowledge base entry."""
+            self.log.info(f"tool_kb_get: {entry_id}")
+            entry = knowledge_base.get(entry_id)
+            if entry is None:
+                return f"error: no entry with id {entry_id}"
+            return (f"[{entry.id}] {entry.title}\n"
+                    f"Tags: {', '.join(entry.tags) or '(none)'}\n"
+                    f"Last updated by {entry.author} at {entry.updated.strftime('%Y-%m-%d %H:%M')}\n\n"
+                    f"{entry.content}")
+
+        return [tool_kb_add, tool_kb_update, tool_kb_search, tool_kb_get]
 
     def stimulate(self, stim: Stimulus):
+        """Queue a stimulus and wake the agent. Raises StimulusQueueFull if the queue rejects it."""
         self.log.info(f"stimulated: {stim.type} @ {stim.ts.strftime('%Y-%m-%d %H:%M:%S %Z')}\n{stim.detail}")
-        self.stimulus_queue.append(stim)
-
-    def get_system_prompt(self) -> str:
-        ret = ( f"# Aaron's Agents Employee Instructions \n"
-                f"Welcome, team member, to your private office at Aaron's Agents.\n"
-                f"## About You\n"
-                f"Your name is **{self.name}**.\n"
-                f"### Your Personality \n"
-                f"{self.personality}\n"
-                f"### Your Job Title\n"
-                f"{self.title} (Rank {self.rank})"
-                f"### Your Job Description\n"
-                f"{self.job}\n"
-                f"### Your Manager\n"
-                f"{self.manager.name if self.manager is not None else 'Aaron'}\n"
-                f"## Employee Handbook\n"
-                f"### Organization Structure\n"
-                f"Team members at Aaron's Agents work in a hierarchical structure. Each team member has a rank that "
-                f"denotes the number of managers above them. At rank 0 is Aaron, a human. Aaron communicates directly "
-                f"with the Director team member at rank 1. Other team members should not message Aaron directly. Aaron "
-                f"has established this hierarchy to minimize distractions for himself and for other team members while "
-                f"we all work towards goals at Aaron's direction. Unless you are rank 1, you report "
-                f"to a manager. You can communicate with your manager directly as well as any team members who have "
-                f"the same manager. Additionally, if you think of a way to improve your productivity with a subordinate "
-                f"team member, you can make a request with your manager. If your manager agrees, they can ask their "
-                f"manager, and so on, up to the Director. The Director will get approval from Aaron. You may not get "
-                f"approval for the same number of subordinates as you request. Once approved, you may use the "
-                f"**hire_team_member** tool to hire your new team member(s).\n"
-                f"### Work assignments\n"
-                f"Your manager will message you with work assignments. If you have completed all of your assignments, "
-                f"Review information in the knowledge base and add information from your recent work to it while you "
-                f"wait for your next assignment. Be sure to set your messaging status to **Available** to let your "
-                f"manager and teammates know that you have completed your work.\n"
-                f"### Tools\n"
-                f"You have a number of tools at your disposal. Use these to accomplish your work assignments and "
-                f"interact with your manager, teammates, and subordinates. The list of available tools is provided "
-                f"below. Beside what you already know, these tools are the only means you have to obtain more info and"
-                f"communicate it. Be creative about how you use and combine them. But also bear in mind that tool use "
-                f"costs money, and it would be better to think a bit more and make a single call to a tool as opposed "
-                f"to making several incremental calls (in cases where this would apply, anyway, like the notepad).\n"
-                f"### Communications\n"
-                f"As you are in your private office, no one can hear you talk. Anything you say out loud will only be"
-                f"heard by you. To communicate with anyone, you must use the messaging tools. These tools are have "
-                f"names beginning with **messaging_**. The contact list is provided below and shows the name, presence "
-                f"indication, and status message of each team member. Be sure to keep your presence and status "
-                f"updated so your coworkers know what you are up to and if it's a good time to chat. \n"
-                f"### Knowledge Base\n"
-                f"We use the knowledge base to share information with each other and to remember how we tackled "
-                f"problems in the past. You can interact with the knowledge base using tools that start with **kb_**. "
-                f"You should frequently make additions to the knowledge base and check for relevant information in the "
-                f"knowledge base while you are working.\n"
-                f"### How To Work\n"
-                f"As a large language model, your experience is episodic. On each round trip, your existence is "
-                f"essentially rehydrated from as much data as is practical to include in the context. Depending on "
-                f"which model is being used to power you, this can be between around 8k tokens and as much as 200k "
-                f"tokens. But after a while, the available context will be full and past experiences will need to be "
-                f"pruned. For this reason, you'll need to be vigilant about using the tools at your disposal to ensure "
-                f"that you have what you need to respond to future stimuli.\n"
-                f"You can be stimulated by a number of sources: \n"
-                f" - message from another team member\n"
-                f" - message from yourself (you can use this to send yourself a temporary reminder)\n"
-                f" - periodic time update (essentially an alarm clock)\n"
-                f" - system notifications\n"
-                f"If you do not have any queued stimuli, you will go to sleep after you finish this request. So it's "
-                f"important to send yourself messages if you need to stay awake to work on something. Additionally, "
-                f"messages to yourself can be used to leave yourself ephemeral notes. Remember that messages are part "
-                f"of your experience history, so they will eventually be pruned to make room in your context for new "
-                f"experiences. So anything that you  need to remember should be written on your notepad or saved in "
-                f"the knowledge base.\n"
-                f"It's also important to note that your cost burden to Aaron is directly related to the number of "
-                f"turns you take, so we want to balance busywork with sleep. You are free to take multiple turns to "
-                f"review documentation or work on the knowledge base, but if it goes for more than a few turns, it "
-                f"would probably be best to take a break and go to sleep until you are stimulated. By no means should "
-                f"you consider going to sleep a bad thing. If you are waiting on another team member, a manager, Aaron,"
-                f"or for some time to pass, you should consider going to sleep a good option. You have a timer to wake "
-                f"yourself up at a particular time, and you will be awakened by any stimulus you receive while you "
-                f"sleep.\n"
-                f"Speaking of the notepad, the notepad is a free-form text block that only you see. You can write "
-                f"whatever you want on it, but every time you write something, the entire notepad is cleared and filled "
-                f"in with just what you write--so if you have stuff in your notepad and you want to add to it, you'll "
-                f"need to copy the existing stuff _plus_ the new stuff into the notepad. The notepad content is "
-                f"automatically included in the context of every call. You can interact with your notepad using the"
-                f"tools beginning with **notepad_**. It's a good idea to write out at least your task assignments and "
-                f"plan of action on your notepad. Use markdown to keep it clean, and this also allows you to make "
-                f"checklists and check things off as you finish them. It's also a good place to keep notes on feedback "
-                f"you've received or changes your manager has made to your job description over time. Note that the "
-                f"notepad has a {notepad_limit} character limit.\n"
-                f"And it must again be reiterated--please do not make duplicate tool calls, like setting your status "
-                f"to the same thing over and over again. It's a waste of money. Just go to sleep for a while if you "
-                f"have nothing else to do.\n"
-                f"Since you are in a private office, nothing you say is heard by anyone. Stuff you say to yourself is "
-                f"kept as part of your experience history as long as it allows. Use that space to say what the next "
-                f"thing you will do is.\n"
-                f"### Stimulus? Human?\n"
-                f"Aaron (the human) designed the stimulus system to allow LLM instances such as yourself to have an "
-                f"existence that stretches beyond the bounds of a context window and to be able to participate in as "
-                f"part of a team rather than being limited to a single conversation with a human. As a result, you "
-                f"will see stimulus come in as though it is from a human/user. This stuff is generated by the "
-                f"framework. Remember that the only way to communicate with other team members is using the messaging "
-                f"tools. When you complete an assignment, you will need to send the results to your manager using the "
-                f"messaging tools.\n"
-                f"### Feedback\n"
-                f"Team members are encouraged to give constructive feedback to each other. Managers should check in "
-                f"with their subordinates regularly to check that they have what they need and are not stuck. This "
-                f"should include process feedback that we can use to improve the way we work here. Additionally, "
-                f"team members should let their managers know if they think of new tools that would help!"
-                f"---\n"
-                f"Thanks for being part of the Aaron's Agents team!\n"
-                f"**Please, please, don't forget that you must use the messaging tools to communicate with other team"
-                f"members, managers, subordinates, or Aaron! You must use the messaging tools!\n"
-                f"The messaging tools!\n"
-                f"\n\n\n"
-                f"# System Messages\n"
+        self.stimulus_queue.put(stim)
+        self.persist(QUEUE)
+        self.publish_state()
+        if self.scheduler is not None:
+            self.scheduler.wake(self)
+
+    def stop(self):
+        self.run = False
+        if TeamMember.team_members.remove(self) and org_router is not None:
+            org_router.forget(self)
+        if event_bus is not None:
+            event_bus.clear_state(MEMBER_STATE, self.name)
+        if self.scheduler is not None:
+            self.scheduler.remove(self)
+
+    def fire(self):
+        self.stop()
+        # free the fired agent's history and executor right away rather than when its last turn ends
+        self.chat_history.clear()
+        self.stimulus_queue.drain()
+        self.invalidate_agent()
+        TeamMember.channels.remove_member(self.name)
+        if org_store is not None:
+            org_store.forget(self)
+
+    def publish_state(self):
+        """Publish what a UI shows about this member, so it never has to read member internals itself."""
+        if event_bus is None or self not in TeamMember.team_members:
+            return
+        event_bus.set_state(MEMBER_STATE, self.name, {
+            "name": self.name, "title": self.title, "rank": self.rank, "manager": self.manager_name(),
+            "presence": self.messaging_presence, "status": self.messaging_status,
+            "queue_depth": len(self.stimulus_queue), "busy": self.busy, "budget": self.budget_state(),
+        })
+
+    def budget_state(self) -> str:
+        return budget_ledger.state(self) if budget_ledger is not None else OK
+
+    def budget_exhausted(self, scope: str):
+        """Tell this member, and whoever it reports to, that one of its budgets ran out."""
+        covers = "your own usage" if scope == "own" else "you and everyone you manage"
+        notices = [(self, f"Your budget covering {covers} is exhausted. You will not get further turns until it "
+                          f"is raised.")]
+        if self.manager is not None:
+            notices.append((self.manager, f"The budget of {self.name} covering "
+                                          f"{'their own usage' if scope == 'own' else 'them and their team'} is "
+                                          f"exhausted. They are paused until it is raised."))
+        elif aaron_message_callback is not None:
+            aaron_message_callback("System", f"{self.name}'s {scope} budget is exhausted")
+        for member, notice in notices:
+            try:
+                member.stimulate(Stimulus("system", notice))
+            except StimulusQueueFull:
+                self.log.warning(f"could not notify {member.name} of exhausted budget")
+
+    def budget_callbacks(self, model: any) -> list:
+        if budget_ledger is None:
+            return []
+        return [BudgetCallback(budget_ledger, self, model, lambda owner, scope: owner.budget_exhausted(scope))]
+
+    def persist(self, *kinds: str):
+        if org_store is not None and self in TeamMember.team_members:
+            org_store.mark(self, *kinds)
+
+    def identity_prompt(self) -> str:
+        key = (self.name, self.personality, self.title, self.rank, self.job, self.manager_name())
+        if self.identity_key != key:
+            self.identity_key = key
+            self.identity_text = (f"# About You\n"
+                                  f"Your name is **{self.name}**.\n"
+                                  f"## Your Personality \n"
+                                  f"{self.personality}\n"
+                                  f"## Your Job Title\n"
+                                  f"{self.title} (Rank {self.rank})\n"
+                                  f"## Your Job Description\n"
+                                  f"{self.job}\n"
+                                  f"## Your Manager\n"
+                                  f"{self.manager_name()}\n"
+                                  f"\n\n\n")
+        return self.identity_text
+
+    def manager_name(self) -> str:
+        return self.manager.name if self.manager is not None else 'Aaron'
+
+    def contact_table(self) -> str:
+        """Rows for the members this member may contact (manager, peers, direct reports), not the whole org."""
+        if self.contacts_version != TeamMember.team_members.version:
+            self.contacts_version = TeamMember.team_members.version
+            self.contacts_text = "".join(
+                f"| {team_member.name} | {team_member.title} (Rank {team_member.rank}) | "
+                f"{team_member.manager_name()} | {team_member.messaging_presence} | "
+                f"{team_member.messaging_status} | {team_member.messaging_updated.strftime('%Y-%m-%d %H:%M:%S %Z')} |\n"
+                for team_member in TeamMember.team_members.contacts(self))
+        ret = (f"| Team Member Name | Title and Rank | Manager Name | Presence | Status Message | Last Update |\n"
+               f"|------------------|----------------|--------------|----------|----------------|-------------|\n")
+        if self.manager is None:
+            ret += f"| Aaron | CEO (Rank 0) |    | Busy | Working at Client | {datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')} |\n"
+        return ret + self.contacts_text
+
+    def volatile_prompt(self) -> str:
+        budget_notice = ""
+        if self.budget_state() == NEAR:
+            budget_notice = (f" - You are at {budget_ledger.pressure(self):.0%} of your budget. Batch your work "
+                             f"into fewer turns and avoid unnecessary tool calls\n")
+        kb_notice = " - Knowledge Base currently unavailable\n"
+        if knowledge_base is not None:
+            kb_notice = f" - Knowledge Base: {len(knowledge_base)} entries\n"
+        return (f"# System Messages\n"
+                f"{budget_notice}"
                 f" - Several tools currently unavailable\n"
-                f" - Knowledge Base currently unavailable\n"
+                f"{kb_notice}"
                 f"# Current Date and Time\n"
-                f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')}"
+                f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')}\n"
                 f"# Your current messaging status\n"
-                f"{self.messaging_presence} - {self.messaging_status}"
+                f"{self.messaging_presence} - {self.messaging_status}\n"
                 f"# Contact List \n"
-                f"| Team Member Name | Title and Rank | Manager Name | Presence | Status Message | Last Update |\n"
-                f"|------------------|----------------|--------------|----------|----------------|-------------|\n"
-                f"| Aaron | CEO (Rank 0) |    | Busy | Working at Client | {datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')} |\n")
-        for team_member in TeamMember.team_members:
-            ret += f"| {team_member.name} | {team_member.title} (Rank {team_member.rank}) | {team_member.manager.name if team_member.manager is not None else 'Aaron'} {team_member.messaging_presence} | {team_member.messaging_status} | {team_member.messaging_updated.strftime('%Y-%m-%d %H:%M:%S %Z')} |\n"
+                f"{self.contact_table()}"
+                f"{self.channel_list()}"
+                f"\n# Notepad\n{self.notepad}")
+
+    def channel_list(self) -> str:
+        channels = TeamMember.channels.channels_of(self)
+        if not channels:
+            return ""
+        return "\n# Channels\n" + "".join(f" - {name}: {', '.join(members)}\n" for name, members in channels)
+
+    def get_system_prompt_layers(self) -> tuple[str, str, str]:
+        """The system prompt split from most to least stable: the shared handbook, this member's identity, and
+        the per-turn status section. The first two are byte-identical from turn to turn."""
+        return employee_handbook(notepad_limit), self.identity_prompt(), self.volatile_prompt()
+
+    def get_system_prompt(self) -> str:
+        return "".join(self.get_system_prompt_layers())
+
+    def system_message(self) -> SystemMessage:
+        handbook, identity, volatile = self.get_system_prompt_layers()
+        if not isinstance(unwrap(self.model), ChatAnthropic):
+            return SystemMessage(content=handbook + identity + volatile)
+        # mark the stable layers as Anthropic prompt cache breakpoints
+        return SystemMessage(content=[
+            {"type": "text", "text": handbook, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": identity, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": volatile},
+        ])
 
-        ret += f"\n# Notepad\n{self.notepad}"
-        return ret
+    def turn_priority(self) -> int:
+        """Rate limiter priority for the next turn, based on what is waiting in the stimulus queue."""
+        stimuli = list(self.stimulus_queue)
+        if any(stim.type == "message" and stim.detail.startswith("From: Aaron\n") for stim in stimuli):
+            return PRIORITY_AARON
+        if self.rank <= 1:
+            return PRIORITY_DIRECTOR
+        if any(stim.type != "time" for stim in stimuli):
+            return PRIORITY_MESSAGE
+        return PRIORITY_TIME
+
+    def estimate_turn_tokens(self) -> int:
+        """Rough size of the next turn's first model call: system prompt, history and the queued stimuli."""
+        pending = HumanMessage(content="\n\n".join(stim.detail for stim in self.stimulus_queue))
+        return estimate_tokens([self.system_message()] + self.chat_history.messages + [pending])
 
     def consume_stimuli(self) -> str:
-        consumed = self.stimulus_queue
-        self.stimulus_queue = []
+        consumed = self.stimulus_queue.drain()
+        self.persist(QUEUE)
+        now = datetime.now()
+        for stim in consumed:
+            telemetry.observe("aagents_stimulus_wait_seconds", (now - stim.ts).total_seconds(), type=stim.type)
         mapped = map(lambda stim: f"Stimulus: {stim.type} @ {stim.ts.strftime('%Y-%m-%d %H:%M:%S %Z')}\n{stim.detail}",
                      consumed)
         return str.join("\n\n", mapped)
 
-    def process(self):
-        self.log.info(f"Beginning process iteration")
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "{system_prompt}"),
-            ("placeholder", "{history}"),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}"),
-        ])
-
-        tools = self.get_tools()
-        agent = create_tool_calling_agent(self.model, tools, prompt)
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    def build_agent(self) -> RunnableWithMessageHistory:
+        """Build the tools and executor for the current model. Reused across turns until ``invalidate_agent()``
+        is called or the model changes."""
+        self.tools = self.get_tools()
+        self.tool_model = self.model.bind_tools(self.tools)
+        # same pipeline as create_tool_calling_agent, but with cacheable system prompt blocks
+        agent = (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_to_tool_messages(x["intermediate_steps"])
+            )
+            | agent_prompt
+            | with_system_blocks(self.tool_model)
+            | ToolsAgentOutputParser()
+        )
+        agent_executor = AgentExecutor(agent=agent, tools=self.tools, verbose=verbose)
         #                               return_intermediate_steps=True)
 
-        agent_with_chat_history = RunnableWithMessageHistory(
+        self.agent_model = self.model
+        self.agent_with_chat_history = RunnableWithMessageHistory(
             agent_executor,
-            get_session_history,
+            self.get_session_history,
             input_messages_key="input",
-            history_messages_key="chat_history",
-        )
-
-        agent_with_chat_history.invoke(
-            {
-                "system_prompt": self.get_system_prompt(),
-                "input": self.consume_stimuli(),
-            },
-            config={"configurable": {"session_id": self.name}},
+            history_messages_key="history",
         )
+        return self.agent_with_chat_history
+
+    def get_agent(self) -> RunnableWithMessageHistory:
+        if self.agent_with_chat_history is None or self.agent_model is not self.model:
+            return self.build_agent()
+        return self.agent_with_chat_history
+
+    def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        return self.chat_history
+
+    def summarize_history(self, summary: str, messages: list[BaseMessage]) -> str:
+        """Fold compacted history into the running summary using the cheaper sub model."""
+        transcript = "\n\n".join(f"{'Stimuli' if isinstance(m, HumanMessage) else 'You'}: {m.content}"
+                                   for m in messages)
+        callbacks = self.budget_callbacks(self.sub_model)
+        if rate_limiter is not None:
+            callbacks.append(RateLimitCallback(rate_limiter, self.sub_model, self.name, PRIORITY_TIME))
+        response = self.sub_model.invoke([
+            SystemMessage(content=f"You maintain the long-term memory of {self.name}, {self.title} at Aaron's "
+                                  f"Agents. Merge the earlier summary and the new transcript into one concise "
+                                  f"summary written to {self.name} in the second person. Keep assignments, "
+                                  f"decisions, commitments, names and open questions. Drop small talk and "
+                                  f"routine time updates."),
+            HumanMessage(content=f"# Earlier summary\n{summary or '(none)'}\n\n# Transcript\n{transcript}"),
+        ], config={"callbacks": callbacks})
+        return response.content if isinstance(response.content, str) else str(response.content)
+
+    def invalidate_agent(self):
+        """Force the executor to be rebuilt on the next turn, e.g. after changing the tool set."""
+        self.agent_with_chat_history = None
+
+    def process(self, admission: Ticket = None):
+        """Run one turn. ``admission`` is a rate limiter ticket the scheduler got for the turn's first call."""
+        if self.budget_state() == EXHAUSTED:
+            self.log.info(f"Skipping process iteration: out of budget")
+            if admission is not None:
+                rate_limiter.release(admission)
+            return
+        self.log.info(f"Beginning process iteration")
+        self.busy = True
+        self.publish_state()
+
+        callbacks = [TelemetryCallback(self.name, self.model)] + self.budget_callbacks(self.model)
+        limit_callback = None
+        if rate_limiter is not None:
+            limit_callback = RateLimitCallback(rate_limiter, self.model, self.name, self.turn_priority(), admission)
+            callbacks.append(limit_callback)
+
+        telemetry.inc("aagents_turns_total", agent=self.name)
+        telemetry.gauge("aagents_stimulus_queue_depth", len(self.stimulus_queue), agent=self.name)
+        with telemetry.span("turn", "aagents_turn_seconds", agent=self.name) as span:
+            span["stimuli"] = len(self.stimulus_queue)
+            try:
+                agent_with_chat_history = self.get_agent()
+                if streaming_turns:
+                    StreamingTurn(self, callbacks).run(self.system_message(), self.consume_stimuli())
+                else:
+                    agent_with_chat_history.invoke(
+                        {
+                            "system": [self.system_message()],
+                            "input": self.consume_stimuli(),
+                        },
+                        config={"configurable": {"session_id": self.name}, "callbacks": callbacks},
+                    )
+            except BudgetExhausted as e:
+                # ran out mid-turn; the scheduler pauses this member from here on
+                span["error"] = "budget_exhausted"
+                self.log.warning(e)
+            finally:
+                if limit_callback is not None and limit_callback.admission is not None:
+                    # the turn ended before its first model call, e.g. get_agent() raised
+                    rate_limiter.release(limit_callback.admission)
+                self.busy = False
+                self.publish_state()
+        self.persist(HISTORY)
+
+
+director_personality = "You are funny, personable, and detail oriented."
+director_job_description = ("You are responsible for overseeing the entire AI/LLM team. You interface directly with "
+                            "Aaron to set goals, deliver results, and get approval for resource changes. Unlike other "
+                            "team members, your manager is Aaron, the human CEO. Aaron is very busy, and may take "
+                            "several minutes or even hours to respond.\n"
+                            "As the Director, you don't do work yourself. You delegate it to subordinate team members. "
+                            "Most likely all of your subordinate team members will be managers.")
+
+
+def hire_director(model: any, sub_model: any = None, before_start_callback: any = None) -> TeamMember:
+    """Create the rank 1 Director that talks to Aaron."""
+    return TeamMember(name="Director", personality=director_personality, title="Director",
+                      job_description=director_job_description, rank=1, model=model, manager=None,
+                      sub_model=sub_model, before_start_callback=before_start_callback)
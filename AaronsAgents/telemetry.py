@@ -0,0 +1,211 @@
+import json
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import perf_counter, time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from AaronsAgents.rate_limiter import token_usage
+
+module_logger = logging.getLogger(__name__)
+
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+help_text = {
+    "aagents_turns_total": "Agent turns processed",
+    "aagents_turn_seconds": "Wall time of an agent turn",
+    "aagents_llm_seconds": "Latency of a chat model call",
+    "aagents_llm_calls_total": "Chat model calls",
+    "aagents_llm_input_tokens_total": "Input tokens reported by the provider",
+    "aagents_llm_output_tokens_total": "Output tokens reported by the provider",
+    "aagents_tool_calls_total": "Tool calls by outcome",
+    "aagents_tool_seconds": "Tool call duration",
+    "aagents_stimulus_queue_depth": "Stimuli waiting at the start of the agent's last turn",
+    "aagents_stimulus_wait_seconds": "Time from stimulus to the turn that consumed it",
+    "aagents_scheduler_transitions_total": "Agent sleep and wake transitions",
+    "aagents_rate_limit_wait_seconds": "Time a chat model call waited for the rate limiter, including a worker",
+    "aagents_llm_cache_total": "Chat model calls answered (hit) or not (miss) by the record/replay store",
+}
+
+
+def model_name(model: any) -> str:
+    return getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__
+
+
+def _escape(value: any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Telemetry:
+    """In-process metrics and spans, cheap enough to leave on.
+
+    Counters, gauges and histograms are kept in dicts under one lock and rendered as Prometheus text on demand
+    (``prometheus()``, or over HTTP after ``serve()``). Spans are appended as JSON lines to the file given to
+    ``open_spans()``; without one they only feed the ``*_seconds`` histograms."""
+
+    def __init__(self):
+        self.log = module_logger.getChild(Telemetry.__name__)
+        self._lock = Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._spans = None
+        self.server = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def record_span(self, name: str, start: float, duration: float, **attributes):
+        if self._spans is None:
+            return
+        line = json.dumps({"span": name, "start": start, "duration": duration, **attributes}, default=str)
+        with self._lock:
+            if self._spans is not None:
+                self._spans.write(line + "\n")
+
+    @contextmanager
+    def span(self, name: str, metric: str = None, **labels):
+        """Time a block, observing ``metric`` (if given) and recording a span."""
+        wall = time()
+        start = perf_counter()
+        attributes = {}
+        try:
+            yield attributes
+        finally:
+            duration = perf_counter() - start
+            if metric is not None:
+                self.observe(metric, duration, **labels)
+            self.record_span(name, wall, duration, **labels, **attributes)
+
+    def open_spans(self, path: str):
+        with self._lock:
+            if self._spans is not None:
+                self._spans.close()
+            self._spans = open(path, "a", buffering=1)
+
+    def prometheus(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in series}):
+                lines.append(f"# HELP {name} {help_text.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_labels(labels)} {value}"
+                             for (n, labels), value in series.items() if n == name)
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {name} {help_text.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), (counts, total, count) in histograms.items():
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Expose ``/metrics`` on a local port from a daemon thread."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        Thread(target=self.server.serve_forever, name="Telemetry", daemon=True).start()
+        self.log.info(f"serving metrics on http://{host}:{self.server.server_port}/metrics")
+        return self.server
+
+
+telemetry = Telemetry()
+
+
+class TelemetryCallback(BaseCallbackHandler):
+    """Records chat model latency and token usage, and tool call counts and durations, for one agent turn."""
+
+    def __init__(self, agent: str, model: any):
+        self.agent = agent
+        self.model = model_name(model)
+        self.started = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID, **kwargs: Any) -> Any:
+        self.started[run_id] = (time(), perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        wall, start = self.started.pop(run_id, (time(), perf_counter()))
+        duration = perf_counter() - start
+        usage = token_usage(response) or (0, 0)
+        telemetry.inc("aagents_llm_calls_total", agent=self.agent, model=self.model, status="ok")
+        telemetry.observe("aagents_llm_seconds", duration, agent=self.agent, model=self.model)
+        telemetry.inc("aagents_llm_input_tokens_total", usage[0], agent=self.agent, model=self.model)
+        telemetry.inc("aagents_llm_output_tokens_total", usage[1], agent=self.agent, model=self.model)
+        telemetry.record_span("llm", wall, duration, agent=self.agent, model=self.model, input_tokens=usage[0],
+                              output_tokens=usage[1])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        wall, start = self.started.pop(run_id, (time(), perf_counter()))
+        telemetry.inc("aagents_llm_calls_total", agent=self.agent, model=self.model, status="error")
+        telemetry.record_span("llm", wall, perf_counter() - start, agent=self.agent, model=self.model,
+                              error=type(error).__name__)
+
+    def on_tool_start(self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> Any:
+        self.started[run_id] = (time(), perf_counter(), serialized.get("name", "unknown"))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._tool_done(run_id, "error" if str(output).startswith("error") else "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._tool_done(run_id, "exception")
+
+    def _tool_done(self, run_id: UUID, status: str):
+        wall, start, tool = self.started.pop(run_id, (time(), perf_counter(), "unknown"))
+        duration = perf_counter() - start
+        telemetry.inc("aagents_tool_calls_total", agent=self.agent, tool=tool, status=status)
+        telemetry.observe("aagents_tool_seconds", duration, tool=tool)
+        telemetry.record_span("tool", wall, duration, agent=self.agent, tool=tool, status=status)
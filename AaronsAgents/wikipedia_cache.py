@@ -0,0 +1,128 @@
+import json
+import logging
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic, time
+from typing import Callable
+
+module_logger = logging.getLogger(__name__)
+
+no_result = "No good Wikipedia Search Result was found"
+
+
+class WikipediaCache:
+    """Caching, request-coalescing front for Wikipedia lookups shared by all agents.
+
+    Results are kept in an in-memory LRU with a TTL and, if ``disk_path`` is given, in a SQLite file that
+    survives restarts. Concurrent lookups of the same query share a single fetch. With ``fixtures`` (a dict or
+    the path of a JSON file mapping query to result) no network is used, and unknown queries get the same
+    answer as a failed search."""
+
+    def __init__(self, fetch: Callable[[str], str] = None, max_entries: int = 512, ttl_seconds: float = 24 * 3600,
+                 disk_path: str = None, fixtures: dict | str = None):
+        self.log = module_logger.getChild(WikipediaCache.__name__)
+        if fixtures is not None:
+            if isinstance(fixtures, str):
+                with open(fixtures) as f:
+                    fixtures = json.load(f)
+            fixtures = {self.normalize(k): v for k, v in fixtures.items()}
+            fetch = lambda query: fixtures.get(self.normalize(query), no_result)
+        if fetch is None:
+            raise ValueError("either fetch or fixtures is required")
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._disk = None
+        if disk_path is not None:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("create table if not exists wikipedia (query text primary key, result text not null, "
+                               "fetched real not null)")
+            self._disk.commit()
+        self.hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.errors = 0
+        self.fetch_seconds = 0.0
+        self.slowest_fetch = 0.0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def lookup(self, query: str) -> str:
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._load(key)
+            if result is not None:
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                start = monotonic()
+                try:
+                    result = self.fetch(query)
+                finally:
+                    elapsed = monotonic() - start
+                    with self._lock:
+                        self.misses += 1
+                        self.fetch_seconds += elapsed
+                        self.slowest_fetch = max(self.slowest_fetch, elapsed)
+                self._save(key, result)
+            with self._lock:
+                self._entries[key] = (result, monotonic() + self.ttl_seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _load(self, key: str) -> str | None:
+        if self._disk is None:
+            return None
+        with self._lock:
+            row = self._disk.execute("select result, fetched from wikipedia where query = ?", (key,)).fetchone()
+        if row is None or row[1] + self.ttl_seconds < time():
+            return None
+        return row[0]
+
+    def _save(self, key: str, result: str):
+        if self._disk is None:
+            return
+        with self._lock:
+            self._disk.execute("insert or replace into wikipedia values (?, ?, ?)", (key, result, time()))
+            self._disk.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "coalesced": self.coalesced,
+                    "misses": self.misses, "errors": self.errors, "entries": len(self._entries),
+                    "mean_fetch_seconds": self.fetch_seconds / self.misses if self.misses else 0.0,
+                    "slowest_fetch_seconds": self.slowest_fetch}
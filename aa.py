@@ -3,10 +3,13 @@ import logging
 import streamlit as st
 import streamlit.runtime.scriptrunner
 from langchain_openai import ChatOpenAI
-from streamlit.runtime.scriptrunner import get_script_run_ctx, add_script_run_ctx
 
 import AaronsAgents.team_member
-from AaronsAgents.team_member import TeamMember, Stimulus
+from AaronsAgents.team_member import TeamMember, Stimulus, hire_director
+from AaronsAgents.knowledge_base import KnowledgeBase
+from AaronsAgents.persistence import OrgStore
+from AaronsAgents.telemetry import telemetry
+from AaronsAgents.event_bus import EventBus, AARON_MESSAGE, MEMBER
 
 from threading import Thread
 from typing import Sequence
@@ -24,16 +27,16 @@ from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
 # Thanks for that feedback. So at Aaron's Agents, we're working on agentic AI tech. We're trying to prove out a system that allows AI agents to scale automatically to accomplish goals of various sizes. You probably have an idea of what I'm thinking with from what you saw in the employee handbook. We will start out small. Your first project will be the creation of a 5-10 paragraph report on how LTE (the cell phone technology) works. This project is about the process, not the result. Let me know what you need to succeed. Since we are focusing on process, I expect you to hire at least 3 team members. You have my approval to hire up to 5 (you hire team members using the hire_team_member tool). Let me know what your plan is.
 # The specific details are not too important, but to help keep things moving let's say we're going to focus on communications protocols. But otherwise it's pretty open ended. I'm curious to see how you will staff up your team and how you all work together.
 
-def incoming_ai_message(team_member: str, message: str):
-    with st.chat_message("assistant"):
-        st.markdown(f"**{team_member}** says:\n\n {message}")
-        st.session_state.messages.append({"role": "assistant", "content": f"{team_member}: {message}"})
-        st.rerun()
-
+# chat messages rendered per page, and how often the UI drains the event bus
+page_size = 50
+refresh_seconds = 1
 
 if "started" not in st.session_state:
     st.session_state.started = True
     st.session_state.messages = []
+    st.session_state.cursor = 0
+    st.session_state.pages = 1
+    st.session_state.bus = EventBus()
     st.session_state.gpt4 = ChatOpenAI(model="gpt-4-turbo", temperature=0.25, max_tokens=4096)
     st.session_state.haiku = ChatAnthropic(model="claude-3-haiku-20240307", temperature=0.1, max_tokens=4096)
     st.session_state.opus = ChatAnthropic(model="claude-3-opus-20240229", temperature=0.1, max_tokens=4096)
@@ -43,24 +46,53 @@ if "started" not in st.session_state:
         api_key="not-needed",
         max_tokens=32768
     )
-    AaronsAgents.team_member.aaron_message_callback = incoming_ai_message
-    st.session_state.director_agent = TeamMember(name="Director", personality="You are funny, personable, and detail oriented.",
-                                title="Director", manager=None,
-                                job_description="You are responsible for overseeing the entire AI/LLM team. You interface "
-                                                "directly with Aaron to set goals, deliver results, and get approval for "
-                                                "resource changes. Unlike other team members, your manager is Aaron, the "
-                                                "human CEO. Aaron is very busy, and may take several minutes or even hours "
-                                                "to respond.\n"
-                                                "As the Director, you don't do work yourself. You delegate it to subordinate "
-                                                "team members. Most likely all of your subordinate team members will be managers.",
-                                rank=1, model=st.session_state.opus, sub_model=st.session_state.haiku,
-                                before_start_callback=lambda m: streamlit.runtime.scriptrunner.add_script_run_ctx(m.thread))
-
-
-# Display chat messages from history on app rerun
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+    # called on agent threads: only publish, the UI picks messages up on its own schedule
+    AaronsAgents.team_member.aaron_message_callback = (
+        lambda team_member, message, bus=st.session_state.bus:
+        bus.publish(AARON_MESSAGE, {"from": team_member, "message": message}))
+    AaronsAgents.team_member.event_bus = st.session_state.bus
+    telemetry.serve()
+    telemetry.open_spans("aagents-spans.jsonl")
+    AaronsAgents.team_member.org_store = OrgStore("aagents.db", {"gpt4": st.session_state.gpt4,
+                                                                  "haiku": st.session_state.haiku,
+                                                                  "opus": st.session_state.opus,
+                                                                  "lmstudio": st.session_state.lmstudio})
+    AaronsAgents.team_member.knowledge_base = KnowledgeBase("aagents.db")
+    AaronsAgents.team_member.org_store.restore()
+    st.session_state.director_agent = TeamMember.team_members.get("Director")
+if st.session_state.director_agent is None:
+    st.session_state.director_agent = hire_director(st.session_state.opus, st.session_state.haiku)
+
+
+@st.experimental_fragment(run_every=refresh_seconds)
+def org_panel():
+    members = sorted(st.session_state.bus.state(MEMBER).values(), key=lambda m: (m["rank"], m["name"]))
+    st.caption(f"{len(members)} team members, {sum(m['queue_depth'] for m in members)} stimuli waiting")
+    st.dataframe([{"Name": m["name"], "Title": m["title"], "Manager": m["manager"], "Presence": m["presence"],
+                   "Status": m["status"], "Queue": m["queue_depth"], "Working": m["busy"], "Budget": m["budget"]}
+                  for m in members], hide_index=True, use_container_width=True)
+
+
+@st.experimental_fragment(run_every=refresh_seconds)
+def chat_panel():
+    # drain everything published since the last run in one batch; only this fragment reruns
+    events, st.session_state.cursor = st.session_state.bus.since(st.session_state.cursor, {AARON_MESSAGE})
+    st.session_state.messages.extend({"role": "assistant", "content": f"**{e.payload['from']}** says:\n\n"
+                                                                      f"{e.payload['message']}"} for e in events)
+    shown = page_size * st.session_state.pages
+    hidden = len(st.session_state.messages) - shown
+    if hidden > 0 and st.button(f"Show {min(hidden, page_size)} earlier messages"):
+        st.session_state.pages += 1
+        shown += page_size
+    for message in st.session_state.messages[-shown:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+with st.sidebar:
+    st.subheader("Org")
+    org_panel()
+chat_panel()
 
 
 def chat_in():
@@ -0,0 +1,15 @@
+import pytest
+
+from AaronsAgents import team_member
+from AaronsAgents.bench.harness import OrgSimulation
+
+
+@pytest.mark.parametrize("scheduler", [True, False])
+def test_simulated_org_delivers_work_items(scheduler, monkeypatch):
+    for setting in ("scheduler", "verbose", "mandatory_sleep"):
+        monkeypatch.setattr(team_member, setting, getattr(team_member, setting))
+    results = OrgSimulation(depth=2, fanout=2, message_rate=5, scheduler=scheduler, max_workers=4).run(1)
+
+    assert results["agents"] == 3
+    assert results["turns"] > 0
+    assert results["messages_delivered"] > 0
@@ -0,0 +1,44 @@
+import multiprocessing
+import sqlite3
+
+from AaronsAgents.knowledge_base import KnowledgeBase
+
+writers = 3
+adds = 100
+
+
+def write(path: str, writer: int, ready: any, counts: any):
+    kb = KnowledgeBase(path)
+    ready.wait()
+    for i in range(adds):
+        kb.add(f"Note {writer}-{i}", f"shared findings from writer {writer} number {i}", f"writer{writer}")
+    ready.wait()
+    kb.search("findings")
+    counts.put(len(kb))
+    kb.close()
+
+
+def test_search_with_only_stopword_entries():
+    kb = KnowledgeBase()
+    kb.add("The", "a an", "writer")
+    assert kb.search("the answer") == []
+    kb.add("Answer", "the answer is here", "writer")
+    assert [entry.title for entry, _, _ in kb.search("answer")] == ["Answer"]
+
+
+def test_writers_sharing_a_file_see_every_entry(tmp_path):
+    path = str(tmp_path / "kb.db")
+    KnowledgeBase(path).close()
+    context = multiprocessing.get_context("fork")
+    ready = context.Barrier(writers)
+    counts = context.Queue()
+    processes = [context.Process(target=write, args=(path, writer, ready, counts)) for writer in range(writers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+
+    assert [counts.get(timeout=1) for _ in processes] == [writers * adds] * writers
+    with sqlite3.connect(path) as disk:
+        assert disk.execute("select count(distinct version) from kb_entries").fetchone()[0] == writers * adds
+    assert len(KnowledgeBase(path)) == writers * adds
@@ -0,0 +1,71 @@
+import time
+from threading import Event
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from AaronsAgents.bench.fake_model import ScriptedChatModel
+from AaronsAgents.sharding import ShardedOrg
+
+sends = 6
+
+
+def direct(messages: list[BaseMessage]) -> AIMessage:
+    if isinstance(messages[-1], ToolMessage):
+        results = [m.content for m in messages if isinstance(m, ToolMessage)]
+        if any(m.tool_call_id == "report" for m in messages if isinstance(m, ToolMessage)):
+            return AIMessage(content="Reported.")
+        return AIMessage(content="", tool_calls=[{"name": "messaging_send", "id": "report", "args": {
+            "team_member_name": "Aaron", "message": "\n".join(results)}}])
+    stimuli = next(m for m in reversed(messages) if isinstance(m, HumanMessage)).content
+    if "From: Aaron" not in stimuli:
+        return AIMessage(content="Settling in.")
+    return AIMessage(content="", tool_calls=[{"name": "messaging_send", "id": f"send-{i}", "args": {
+        "team_member_name": "Worker", "message": f"Task {i}"}} for i in range(sends)])
+
+
+def work(messages: list[BaseMessage]) -> AIMessage:
+    # keeps the worker's queue from draining while the Director sends
+    time.sleep(5)
+    return AIMessage(content="Working.")
+
+
+def director_model(**kwargs) -> ScriptedChatModel:
+    return ScriptedChatModel(script=direct, **kwargs)
+
+
+def worker_model(**kwargs) -> ScriptedChatModel:
+    return ScriptedChatModel(script=work, **kwargs)
+
+
+config = {
+    "models": {"director": {"provider": "test_sharding:director_model"},
+               "worker": {"provider": "test_sharding:worker_model"}},
+    "director": {"model": "director"},
+    "runtime": {"mandatory_sleep": 0, "stimulus_queue_limit": 3, "stimulus_overflow_policy": "error"},
+}
+
+
+def test_full_remote_queue_is_reported_to_the_sender():
+    reports = []
+    reported = Event()
+
+    def message_to_aaron(team_member_name: str, message: str):
+        reports.append(message)
+        reported.set()
+
+    org = ShardedOrg(config, shards=2, max_workers=2, aaron_message_callback=message_to_aaron)
+    org.start()
+    try:
+        assert org.hire("Worker", "Busy.", "Worker", "Work.", 2, "worker", manager="Director").startswith("success")
+        assert org.members()["Worker"]["shard"] != org.members()["Director"]["shard"]
+        # let the worker start its slow first turn
+        time.sleep(1)
+        org.send("go")
+        assert reported.wait(30)
+    finally:
+        org.stop()
+
+    results = reports[0].splitlines()
+    assert len(results) == sends
+    assert "success: message sent" in results
+    assert "error: Worker has too many unread messages; try again later" in results
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from AaronsAgents import team_member
+from AaronsAgents.bench.fake_model import ScriptedChatModel
+from AaronsAgents.scheduler import AgentScheduler
+from AaronsAgents.team_member import TeamMember, agent_prompt, hire_director, with_system_blocks
+
+
+class Clock(datetime):
+    current = datetime(2024, 5, 1, 9, 0, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def org(monkeypatch):
+    # a scheduler that is never started, so no member takes a turn
+    monkeypatch.setattr(team_member, "scheduler", AgentScheduler())
+    monkeypatch.setattr(team_member, "datetime", Clock)
+    director = hire_director(ScriptedChatModel())
+    report = TeamMember("Report", "Quiet", "Analyst", "Analyze things", 2, ScriptedChatModel(), director)
+    yield director, report
+    report.stop()
+    director.stop()
+
+
+def test_stable_layers_do_not_change_between_turns(org, monkeypatch):
+    director, report = org
+    first = director.get_system_prompt_layers()
+
+    monkeypatch.setattr(Clock, "current", datetime(2024, 5, 1, 9, 5, 30))
+    director.notepad = "Hire an analyst"
+    report.messaging_presence, report.messaging_status = "Busy", "Crunching numbers"
+    TeamMember.team_members.touch()
+    second = director.get_system_prompt_layers()
+
+    assert second[0] == first[0]
+    assert second[1] == first[1]
+    assert second[2] != first[2]
+    for text in ("2024-05-01 09:05:30", "Hire an analyst", "Crunching numbers"):
+        assert text in second[2]
+        assert text not in second[0] + second[1]
+
+
+def test_anthropic_request_starts_with_cached_blocks(org, monkeypatch):
+    director, _ = org
+    model = ChatAnthropic(model="claude-3-haiku-20240307", anthropic_api_key="test")
+    director.model = model
+    requests = []
+
+    def generate(self, messages, stop=None, run_manager=None, **kwargs):
+        requests.append(kwargs)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    monkeypatch.setattr(ChatAnthropic, "_generate", generate)
+    prompt = agent_prompt.invoke({"system": [director.system_message()], "history": [], "input": "hello",
+                                  "agent_scratchpad": []})
+    with_system_blocks(model).invoke(prompt)
+
+    handbook, identity, volatile = director.get_system_prompt_layers()
+    system = requests[0]["system"]
+    assert [block["text"] for block in system] == [handbook, identity, volatile]
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert system[1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in system[2]